@@ -6,6 +6,7 @@ from clotho.clothoconfig import ClothoConfig
 from clotho.clothodb import ClothoDB
 from clotho.resourceshed import ResourceShed
 from clotho.tool import Tool
+from clotho.toolshed import ToolShed
 
 
 class Clotho:
@@ -26,6 +27,7 @@ class Clotho:
 
         self._db = ClothoDB(source)
         self._resource_shed = ResourceShed(self._db)
+        self._tool_shed = ToolShed(self._db, self._resource_shed)
 
     def delete_tool(self, tool_name=None, tool_id=None):
         """Delete a Clotho tool. Requires either a name or an ID.
@@ -36,6 +38,7 @@ class Clotho:
 
         tool = Tool(self._db, {'Name': tool_name}, tool_id, self._resource_shed)
         tool.delete()
+        self._tool_shed.remove(tool)
 
     def delete_tool_output(self, output_name, tool_name=None, tool_id=None):
         """Delete one of a tool's outputs. Requires either a tool name or a tool ID.
@@ -47,6 +50,7 @@ class Clotho:
 
         tool = Tool(self._db, {'Name': tool_name}, tool_id, self._resource_shed)
         tool.delete_output(output_name)
+        self._tool_shed.remove(tool)
 
     def delete_tool_param(self, param_name, tool_name=None, tool_id=None):
         """Delete one of a tool's parameters. Requires either a tool name or a tool ID.
@@ -58,6 +62,7 @@ class Clotho:
 
         tool = Tool(self._db, {'Name': tool_name}, tool_id, self._resource_shed)
         tool.delete_param(param_name)
+        self._tool_shed.remove(tool)
 
     def build_schema(self):
         """Create the Clotho schema in the database."""
@@ -70,7 +75,7 @@ class Clotho:
         :param config: A dictionary, the path to a config file, or None to use the default config
         """
 
-        clotho_config = ClothoConfig(self._db)
+        clotho_config = ClothoConfig(self._db, self._tool_shed)
         clotho_config.import_config(config)
 
     def run_tool(self, tool_name=None, tool_id=None, **kwargs):
@@ -102,5 +107,5 @@ class Clotho:
         :return: The path to the output file
         """
 
-        clotho_config = ClothoConfig(self._db)
+        clotho_config = ClothoConfig(self._db, self._tool_shed)
         return clotho_config.sync_config(input_file, output_file)
@@ -1,6 +1,5 @@
 """Define the ClothoConfig class."""
 
-import os
 import pathlib
 
 import yaml
@@ -10,17 +9,24 @@ from clotho.errors import ClothoError
 from clotho.logutils import raise_error
 from clotho.resource import Resource
 from clotho.tool import Tool
+from clotho.toolshed import ToolShed
+
+DEFAULT_CONFIG_NAME = 'ClothoConfig.yaml'
+Dumper = getattr(yaml, 'CSafeDumper', yaml.SafeDumper)
+Loader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
 
 
 class ClothoConfig:
     """Wraps the Clotho configuration."""
 
-    def __init__(self, db):
+    def __init__(self, db, tool_shed=None):
         if isinstance(db, ClothoDB):
             self._db = db
         else:
             self._db = ClothoDB(db)
 
+        self._tool_shed = tool_shed or ToolShed(self._db)
+
     def import_config(self, config=None):
         """Write a config dictionary or a config file to the database.
 
@@ -39,28 +45,31 @@ class ClothoConfig:
         if not input_configs:
             return {}
         output_configs = {}
-        for name, config in input_configs.items():
-            if config is None:
-                config = {}
-            config['Name'] = name
-            config_obj = config_class(self._db, config)
-            config_obj.commit()
-            config = config_obj.config
-            name = config.pop('Name')
-            output_configs[name] = config
+        with self._db.transaction():
+            for name, config in input_configs.items():
+                if config is None:
+                    config = {}
+                config['Name'] = name
+                config_obj = config_class(self._db, config)
+                config_obj.commit()
+                if isinstance(config_obj, Tool):
+                    self._tool_shed.add(config_obj)
+                config = config_obj.config
+                name = config.pop('Name')
+                output_configs[name] = config
         return output_configs
 
     def import_file(self, config_file=None):
         if config_file:
             config_file = pathlib.Path(config_file)
         else:
-            config_file = pathlib.Path(os.getcwd()) / 'ClothoConfig.yaml'
+            config_file = pathlib.Path.cwd() / DEFAULT_CONFIG_NAME
 
         # Get the configuration from the file.
         if not config_file.exists():
             raise_error('Config file not found: {}'.format(config_file), ClothoError)
         with open(config_file, 'r') as stream:
-            config = yaml.load(stream, Loader=yaml.FullLoader)
+            config = yaml.load(stream, Loader=Loader)
         if config is None:
             raise_error('Config file is empty. {}'.format(config_file), ClothoError)
         return self.import_config(config)
@@ -82,7 +91,7 @@ class ClothoConfig:
         """
 
         if not input_file:
-            input_file = pathlib.Path(os.getcwd()) / 'ClothoConfig.yaml'
+            input_file = pathlib.Path.cwd() / DEFAULT_CONFIG_NAME
         if not output_file:
             output_file = input_file
         config = self.import_file(input_file)
@@ -99,9 +108,9 @@ class ClothoConfig:
                     pred_ids.append(pred_id)
         for pred_id in set(pred_ids):
             if pred_id not in tool_ids:
-                tool = Tool(self._db, id=pred_id)
+                tool = self._tool_shed.get(id=pred_id)
                 config['tools'][tool.name] = tool.config
 
         with open(output_file, 'w') as f:
-            f.write(yaml.dump(config))
+            f.write(yaml.dump(config, Dumper=Dumper))
         return output_file
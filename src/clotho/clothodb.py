@@ -1,17 +1,68 @@
 """Define the ClothDB class."""
 
+import functools
 import pathlib
 
-import numpy as np
-import pandas as pd
-
 import clotho.logutils
 from clotho.errors import ClothoError
-from clotho.sqlitedb import SQLiteDB
+from clotho.utils import get_schema_dtypes
 from clotho.utils import get_schema_templates
 from clotho.utils import fill_nans
 
 
+# Lists of columns to index together, for the lookups that compare them as they are, by table.
+INDEXES = {
+    'ActivityIO': [['ActivityID']],
+    'BatchActivity': [['BatchID']],
+    'ToolOutputs': [['ToolID']],
+    'ToolParams': [['ToolID', 'Name']],
+    'ToolPredecessors': [['ToolID']]
+}
+
+# Columns that get_row_insensitive searches, by table.
+NOCASE_INDEXES = {
+    'Resources': ['Name', 'ResourceID'],
+    'ToolParams': ['ParamID'],
+    'Tools': ['Name', 'ToolID']
+}
+
+
+@functools.lru_cache(maxsize=None)
+def _template_dtypes(table_name):
+    """Get the column types for a table in the Clotho schema.
+
+    :param table_name: The name of a table in the Clotho schema
+
+    :return: A dictionary of column names and types, or None if the table isn't in the schema
+    """
+
+    return get_schema_dtypes(table_name)
+
+
+def _to_column_type(val, dtype):
+    """Convert a value the way that DataFrame.astype would convert it to a column's type.
+
+    :param val: A value for a table cell
+    :param dtype: The column's dtype, from the schema template
+
+    :return: The converted value
+    """
+
+    kind = dtype.kind
+    if kind == 'b':
+        return bool(val)
+    if val is None:
+        return None
+    if kind in 'iu':
+        return int(val)
+    if kind == 'f':
+        return float(val)
+    if kind == 'M':
+        import pandas as pd
+        return pd.Timestamp(val)
+    return val
+
+
 class ClothoDB:
     """Represents a Clotho database."""
 
@@ -31,18 +82,43 @@ class ClothoDB:
         self.schema = 'clotho'
         self.init_db(source)
 
-    def build_schema(self):
-        """Create the Clotho schema in the database."""
+    def build_schema(self, create_indexes=True):
+        """Create the Clotho schema in the database.
+
+        :param create_indexes: False to leave the indexes for a later call to create_indexes
+        """
 
         # See if each table already exists.
-        table_names = self.table_names
         for table_name, df in get_schema_templates().items():
-            if table_name in table_names:
+            if self.has_table(table_name):
                 continue
 
             # Create each table.
             self.import_df(df, table_name)
 
+        if create_indexes:
+            self.create_indexes()
+
+    def close(self):
+        """Close any open connections to the database."""
+
+        self._db.close()
+
+    def create_indexes(self):
+        """Index the columns that we search by.
+
+        Filling tables before indexing them is faster than updating the indexes for every row.
+        """
+
+        for table_name, column_lists in INDEXES.items():
+            for columns in column_lists:
+                self._db.create_index(table_name, columns)
+
+        # Index the columns that we search without regard to capitalization.
+        for table_name, columns in NOCASE_INDEXES.items():
+            for column in columns:
+                self._db.create_index(table_name, [column], nocase=True)
+
     def delete_row(self, table_name, key, value):
         """Delete any rows that match the key/value pair.
 
@@ -53,20 +129,19 @@ class ClothoDB:
 
         self._db.delete_row(table_name, key, value)
 
-    def get(self, table_name, query=None):
+    def get(self, table_name, query=None, where=None, columns=None, order_by=None):
         """Get a table from the database.
 
         :param table_name: The name of a table in a database
         :param query: An optional query to filter the data
+        :param where: An optional dictionary of column names and values (or lists of values)
+        :param columns: An optional list of the columns to get (the default is all of them)
+        :param order_by: An optional column name, or list of column names, to sort the rows by
 
         :return: A Pandas dataframe containing the table's data
         """
 
-        df = self._db.get(table_name, query)
-        if df is None:
-            return
-        # df = df.replace(np.nan, None)
-        return df
+        return self._db.get(table_name, query, where, columns, order_by)
 
     def get_columns(self, table_name):
         """Get a list of column names for a table.
@@ -88,19 +163,12 @@ class ClothoDB:
         :return: A dictionary containing the data from a table row
         """
 
-        if isinstance(value, str):
-            query = """ "{}" == '{}' """.format(key, value)
-            if self.type == 'SQL Server':
-                query += ' COLLATE SQL_Latin1_General_CP1_CS_AS'
-        else:
-            query = """ "{}" == {} """.format(key, value)
-        df = self._db.get(table_name, query)
-        if df is None:
+        rows = self._db.get_rows_where(table_name, key, value, 2)
+        if rows is None:
             return
-        rows = df.to_dict('records')
         if len(rows) > 1:
             clotho.logutils.raise_error(
-                'Multiple rows in {} for {}.'.format(table_name, query),
+                'Multiple rows in {} for {} == {}.'.format(table_name, key, value),
             )
         if len(rows) == 1:
             return rows[0]
@@ -115,12 +183,9 @@ class ClothoDB:
         :return: A dictionary containing the data from a table row
         """
 
-        df = self._db.get(table_name)
-        if df is None:
+        rows = self._db.get_rows_insensitive(table_name, key, value, 2)
+        if rows is None:
             return
-        df = df[df[key].str.lower() == str(value).lower()]
-        df = df.replace({np.nan: None})
-        rows = df.to_dict('records')
         if len(rows) > 1:
             clotho.logutils.raise_error(
                 'Multiple rows in {} for {} == {}.'.format(table_name, key, value),
@@ -128,6 +193,41 @@ class ClothoDB:
         if len(rows) == 1:
             return rows[0]
 
+    def get_rows(self, table_name, query=None, params=(), limit=None):
+        """Get rows from a table as dictionaries, without building a dataframe.
+
+        :param table_name: The name of a table in the database
+        :param query: An optional query to filter the data, with "?" placeholders for values
+        :param params: Values for the placeholders in the query
+        :param limit: The maximum number of rows to get, or None to get them all
+
+        :return: A list of dictionaries, or None if the query failed
+        """
+
+        return self._db.get_rows(table_name, query, params, limit)
+
+    def get_value(self, table_name, column, where=None):
+        """Get a single value from a table, without building a dataframe.
+
+        :param table_name: The name of a table in the database
+        :param column: The name of the column to get the value from
+        :param where: An optional dictionary of column names and values (or lists of values)
+
+        :return: The value from the first matching row, or None if no rows match
+        """
+
+        return self._db.get_value(table_name, column, where)
+
+    def has_table(self, table_name):
+        """Check whether a table exists in the database.
+
+        :param table_name: The name of a table
+
+        :return: True if the table exists
+        """
+
+        return self._db.has_table(table_name)
+
     def import_df(self, df, table_name, overwrite=False):
         """Create or replace a table based on a Pandas dataframe.
 
@@ -149,43 +249,60 @@ class ClothoDB:
             source = pathlib.Path(source)
         if isinstance(source, pathlib.Path):
             if source.suffix.lower() == '.sqlite':
+                # Import here, so that we only load Pandas when we actually need a database.
+                from clotho.sqlitedb import SQLiteDB
                 self._db = SQLiteDB(source, self.schema)
                 return
         clotho.logutils.raise_error(f'Unrecognized source type: {source}')
 
     def set_row(self, table_name, row, id_col):
-        """Create or replace a row in a table.
+        """Create a row in a table, or update the existing row with the same unique ID.
+
+        When updating an existing row, columns that aren't in the new row keep their old values.
 
         :param table_name: The name of a table in the database
         :param row: A dictionary to define the new row
         :param id_col: The name of the unique ID column
         """
 
-        # Get the existing table, minus the row we're replacing.
-        df = self._db.get(table_name)
-        if df is None:
-            df = pd.DataFrame()
-        else:
-            df = df[df[id_col] != row[id_col]]
+        self.set_rows(table_name, [row], id_col)
+
+    def set_rows(self, table_name, rows, id_col):
+        """Create several rows in a table at once, or update the existing rows with the same IDs.
 
-        # Make the input row into a dataframe.
-        template = get_schema_templates().get(table_name)
-        if template is not None:
-            new_row = template.copy(True)
-            new_row.loc[0, row.keys()] = list(row.values())
-            new_row = new_row.astype(template.dtypes.to_dict())
-            df = df.astype(template.dtypes.to_dict())
-        else:
-            new_row = pd.DataFrame([row])
+        When updating an existing row, columns that aren't in the new row keep their old values.
 
-        # Put the old data plus the new row in the database.
-        df = pd.concat([df, new_row], ignore_index=True)
-        self._db.import_df(df, table_name, True)
+        :param table_name: The name of a table in the database
+        :param rows: A list of dictionaries to define the new rows
+        :param id_col: The name of the unique ID column
+        """
+
+        # Convert the values to the schema's column types.
+        dtypes = _template_dtypes(table_name)
+        if dtypes is not None:
+            rows = [
+                {
+                    key: _to_column_type(val, dtypes[key]) if key in dtypes else val
+                    for key, val in row.items()
+                }
+                for row in rows
+            ]
+
+        # Insert the rows, or replace the values in the existing rows.
+        self._db.upsert_many(table_name, rows, id_col)
 
     @property
     def table_names(self):
         return self._db.table_names
 
+    def transaction(self):
+        """Group writes so that they're committed together (or not at all).
+
+        :return: A context manager for the transaction
+        """
+
+        return self._db.transaction()
+
     @property
     def type(self):
         return self._db.type
@@ -1,6 +1,5 @@
 """Provide functions for starting the logger."""
 
-import datetime
 import logging
 import logging.handlers
 import pathlib
@@ -10,6 +9,8 @@ import yaml
 
 from clotho.errors import ClothoError
 
+Loader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
 
 class SubstrateFileHandler(logging.handlers.TimedRotatingFileHandler):
     """Overrides the file handler to prevent multi-line messages."""
@@ -17,7 +18,18 @@ class SubstrateFileHandler(logging.handlers.TimedRotatingFileHandler):
     def emit(self, record):
         """Split multi-line messages into multiple messages."""
 
-        for chunk in str(record.msg).split('\n'):
+        try:
+            msg = record.getMessage()
+        except Exception:
+            self.handleError(record)
+            return
+        if '\n' not in msg:
+            super().emit(record)
+            return
+
+        # The arguments are already in the message.
+        record.args = None
+        for chunk in msg.split('\n'):
             record.msg = chunk
             super().emit(record)
 
@@ -28,12 +40,13 @@ def check_rollover(handler):
     :param SubstrateFileHandler handler: Instantiated handler
     """
 
-    with open(handler.baseFilename, 'r') as log_file:
-        first_line = log_file.readline()
-    if not first_line:
+    # Each line starts with a YYYY-MM-DD date, so we only need the first 10 bytes.
+    with open(handler.baseFilename, 'rb') as log_file:
+        head = log_file.read(10)
+    if not head:
         return
-    log_date = first_line.split(',')[0]
-    current_date = datetime.datetime.strftime(datetime.datetime.utcnow(), '%Y-%m-%d')
+    log_date = head.decode('ascii', 'replace')
+    current_date = time.strftime('%Y-%m-%d', time.gmtime())
     if current_date != log_date:
         handler.doRollover()
 
@@ -50,7 +63,7 @@ def get_log_dir(config_path=None):
     if config_path:
         try:
             with open(config_path, 'r') as stream:
-                config_data = yaml.load(stream, Loader=yaml.FullLoader) or {}
+                config_data = yaml.load(stream, Loader=Loader) or {}
                 dir_string = config_data.get('log directory')
                 if dir_string:
                     log_dir = pathlib.Path(dir_string)
@@ -73,8 +86,12 @@ def raise_error(message, error_class=ClothoError):
     """
 
     try:
-        for chunk in str(message).split('\n'):
-            logging.error(chunk)
+        message_string = str(message)
+        if '\n' not in message_string:
+            logging.error(message_string)
+        else:
+            for chunk in message_string.split('\n'):
+                logging.error(chunk)
     except Exception as err:
         print('Cannot write to the log file.')
         print(str(err))
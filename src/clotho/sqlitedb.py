@@ -1,14 +1,108 @@
 """Define the SQLiteDB class."""
 
+import contextlib
+from datetime import datetime
 import logging
+import os
 import pathlib
 import sqlite3
 from sqlite3.dbapi2 import OperationalError
+import threading
 
+import numpy as np
 import pandas as pd
 
-from clotho.utils import condition
-from clotho.utils import quote_val
+from clotho.errors import ClothoError
+from clotho.logutils import raise_error
+
+
+def get_sql_type(series):
+    """Get the SQLite column type for a Pandas series, matching the types that to_sql uses.
+
+    :param series: A Pandas series
+
+    :return: The name of a SQLite column type
+    """
+
+    kind = series.dtype.kind
+    if kind == 'O':
+        kind = {
+            'boolean': 'b',
+            'datetime': 'M',
+            'floating': 'f',
+            'integer': 'i'
+        }.get(pd.api.types.infer_dtype(series, skipna=True), kind)
+    if kind in 'biu':
+        return 'INTEGER'
+    if kind == 'f':
+        return 'REAL'
+    if kind == 'M':
+        return 'TIMESTAMP'
+    return 'TEXT'
+
+
+def to_param(val):
+    """Convert a value to a type that sqlite3 can bind to a query parameter.
+
+    Values that sqlite3 can't bind, like lists, are stored as their string representations.
+
+    :param val: A value, possibly a NumPy or Pandas scalar or a path
+
+    :return: The value as a built-in Python type
+    """
+
+    if isinstance(val, np.generic):
+        return val.item()
+    if val is pd.NaT:
+        return None
+    if isinstance(val, datetime):
+        return val.isoformat(' ')
+    if val is None or isinstance(val, (str, int, float, bytes)):
+        return val
+    return str(val)
+
+
+def where_conditions(where):
+    """Build the conditions for a WHERE clause from a dictionary.
+
+    :param where: A dictionary of column names and values (or lists of values), or None
+
+    :return: A list of condition strings with "?" placeholders, and a list of their values
+    """
+
+    conditions = []
+    params = []
+    if not where:
+        return conditions, params
+    for col, val in where.items():
+        if isinstance(val, (list, tuple, set)):
+            conditions.append('[{}] IN ({})'.format(col, ', '.join(['?'] * len(val))))
+            params.extend(to_param(item) for item in val)
+        else:
+            conditions.append('[{}] = ?'.format(col))
+            params.append(to_param(val))
+    return conditions, params
+
+
+# Set CLOTHO_SQLITE_WAL=0 to keep SQLite's default rollback journal (no -wal or -shm files).
+WAL_ENV_VAR = 'CLOTHO_SQLITE_WAL'
+
+
+def tune_connection(connection):
+    """Set PRAGMAs that make lots of small reads and writes cheaper.
+
+    :param connection: A new connection to a SQLite database
+    """
+
+    # Send all of the PRAGMAs in one script, since this runs for every new connection.
+    pragmas = [
+        'PRAGMA temp_store=MEMORY;',
+        'PRAGMA cache_size=-20000;',
+        'PRAGMA mmap_size=268435456;'
+    ]
+    if os.environ.get(WAL_ENV_VAR, '1') != '0':
+        pragmas = ['PRAGMA journal_mode=WAL;', 'PRAGMA synchronous=NORMAL;'] + pragmas
+    connection.executescript('\n'.join(pragmas))
 
 
 class SQLiteDB:
@@ -17,6 +111,33 @@ class SQLiteDB:
     def __init__(self, source, schema=None) -> None:
         self.schema = schema
         self.source = pathlib.Path(source)
+        self._connections = []
+        self._local = threading.local()
+        self._statements = {}
+        self._table_names = None
+        self._table_set = None
+        self._columns = {}
+        self._unique_indexes = set()
+
+    def __del__(self):
+        self.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """Close any open connections to the database."""
+
+        for connection in getattr(self, '_connections', []):
+            try:
+                connection.close()
+            except Exception as e:
+                logging.debug('Failed to close {}. {}'.format(self.source, e))
+        self._connections = []
+        self._local = threading.local()
 
     def prepend_schema(self, table_name) -> str:
         """Prepend the schema name to the table name.
@@ -30,6 +151,80 @@ class SQLiteDB:
             return self.schema + '.' + table_name
         return table_name
 
+    def create_index(self, table_name, columns, nocase=False):
+        """Index one or more columns, if they aren't already indexed.
+
+        :param table_name: The name of a table in the database
+        :param columns: A list of column names
+        :param nocase: Indicates whether to ignore capitalization, for case-insensitive searches
+        """
+
+        table_name = self.prepend_schema(table_name)
+        index_name = 'ix_{}_{}'.format(table_name, '_'.join(columns))
+        col_template = '[{}] COLLATE NOCASE' if nocase else '[{}]'
+        if nocase:
+            index_name += '_nocase'
+        connection = self._get_connection()
+        try:
+            connection.execute(
+                'CREATE INDEX IF NOT EXISTS [{}] ON [{}] ({})'.format(
+                    index_name,
+                    table_name,
+                    ', '.join(col_template.format(col) for col in columns)
+                )
+            )
+        except Exception as e:
+            logging.warning('Failed to index {}. {}'.format(table_name, e))
+
+    def _add_columns(self, connection, table_name, col_names):
+        """Add any columns that a table doesn't have yet.
+
+        :param connection: A connection to the database
+        :param table_name: The name of the table, including the schema
+        :param col_names: The names of the columns that the table should have
+        """
+
+        cursor = connection.execute('PRAGMA table_info([{}])'.format(table_name))
+        existing = {info[1].lower() for info in cursor.fetchall()}
+        self._columns.pop(table_name, None)
+        for col_name in col_names:
+            if not col_name.lower() in existing:
+                connection.execute(
+                    "ALTER TABLE [{}] ADD COLUMN '{}'".format(table_name, col_name)
+                )
+
+    def _add_unique_index(self, connection, table_name, id_col):
+        """Index the unique ID column, which ON CONFLICT needs, if we haven't already.
+
+        :param connection: A connection to the database
+        :param table_name: The name of the table, including the schema
+        :param id_col: The name of the unique ID column
+        """
+
+        index_key = (table_name, id_col)
+        if index_key in self._unique_indexes:
+            return
+        try:
+            connection.execute(
+                'CREATE UNIQUE INDEX IF NOT EXISTS [ux_{0}_{1}] ON [{0}] ([{1}])'.format(
+                    table_name,
+                    id_col
+                )
+            )
+        except sqlite3.IntegrityError as e:
+            raise_error(
+                'Cannot write {}, because its {} column has duplicate values. {}'.format(
+                    table_name, id_col, e
+                )
+            )
+        self._unique_indexes.add(index_key)
+
+    def _commit(self, connection):
+        """Commit pending changes, unless they're part of a larger transaction."""
+
+        if not getattr(self._local, 'transaction_depth', 0):
+            connection.commit()
+
     def delete_row(self, table_name, key, value):
         """Delete any rows that match the key/value pair.
 
@@ -38,56 +233,202 @@ class SQLiteDB:
         :param value: The value to search for in the column
         """
 
-        if isinstance(value, str):
-            query = "{} = '{}'".format(key, value)
-        else:
-            query = "{} = {}".format(key, value)
         table_name = self.prepend_schema(table_name)
+        statement_key = ('DELETE', table_name, key)
+        sql = self._statements.get(statement_key)
+        if sql is None:
+            sql = 'DELETE FROM [{}] WHERE [{}] = ?'.format(table_name, key)
+            self._statements[statement_key] = sql
         connection = self._get_connection()
-        connection.execute('DELETE FROM [{}] WHERE {}'.format(table_name, query))
-        connection.commit()
+        connection.execute(sql, (to_param(value),))
+        self._commit(connection)
+
+    def fetch_rows(self, sql, params=()):
+        """Run a query and get the results as dictionaries.
+
+        :param sql: A SQL query
+        :param params: Values for any "?" placeholders in the query
+
+        :return: A list of dictionaries
+        """
+
+        cursor = self._get_connection().cursor()
+        cursor.row_factory = sqlite3.Row
+        cursor.execute(sql, [to_param(param) for param in params])
+        return [dict(row) for row in cursor.fetchall()]
 
-    def get(self, table_name, query=None):
+    def get(self, table_name, query=None, where=None, columns=None, order_by=None):
         """Get a table from the database.
 
         :param table_name: The name of a table in a database
         :param query: An optional query to filter the data
+        :param where: An optional dictionary of column names and values (or lists of values)
+        :param columns: An optional list of the columns to get (the default is all of them)
+        :param order_by: An optional column name, or list of column names, to sort the rows by
 
         :return: A Pandas dataframe containing the table's data
         """
 
         table_name = self.prepend_schema(table_name)
-        sql = "SELECT * FROM '{}'".format(table_name)
+        if columns:
+            select = ', '.join('[{}]'.format(col) for col in columns)
+        else:
+            select = '*'
+        sql = "SELECT {} FROM '{}'".format(select, table_name)
+        conditions, params = where_conditions(where)
         if query:
-            sql += " WHERE {}".format(query)
+            conditions.insert(0, query)
+        if conditions:
+            sql += " WHERE {}".format(' AND '.join(conditions))
+        if order_by:
+            if isinstance(order_by, str):
+                order_by = [order_by]
+            sql += " ORDER BY {}".format(', '.join('[{}]'.format(col) for col in order_by))
         connection = self._get_connection()
         try:
-            df = pd.read_sql(sql, connection)
+            df = pd.read_sql(sql, connection, params=params)
         except Exception as e:
             logging.debug('Failed to read {}. {}'.format(table_name, e))
             df = None
-        connection.close()
 
         return df
 
     def get_columns(self, table_name):
         """Get a list of column names for a table.
 
+        The list is cached until this object changes the table.
+
         :param table_name: The name of the table whose columns we want
 
         :return: A list of column names
         """
 
-        df = self.get(table_name, '0 == 1')
-        return df.columns
+        table_name = self.prepend_schema(table_name)
+        columns = self._columns.get(table_name)
+        if columns is None:
+            connection = self._get_connection()
+            cursor = connection.execute('PRAGMA table_info([{}])'.format(table_name))
+            columns = [info[1] for info in cursor.fetchall()]
+            if not columns:
+                return columns
+            self._columns[table_name] = columns
+        return list(columns)
+
+    def get_rows(self, table_name, query=None, params=(), limit=None):
+        """Get rows from a table as dictionaries, without building a dataframe.
+
+        :param table_name: The name of a table in a database
+        :param query: An optional query to filter the data
+        :param params: Values for any "?" placeholders in the query
+        :param limit: The maximum number of rows to get, or None to get them all
+
+        :return: A list of dictionaries, or None if the query failed
+        """
+
+        table_name = self.prepend_schema(table_name)
+        sql = "SELECT * FROM [{}]".format(table_name)
+        if query:
+            sql += " WHERE {}".format(query)
+        if limit is not None:
+            sql += ' LIMIT {}'.format(int(limit))
+        try:
+            return self.fetch_rows(sql, params)
+        except Exception as e:
+            logging.debug('Failed to read {}. {}'.format(table_name, e))
+
+    def get_rows_insensitive(self, table_name, key, value, limit=None):
+        """Get the rows where a column matches a string, regardless of capitalization.
+
+        :param table_name: The name of a table in the database
+        :param key: The name of the column to search
+        :param value: The value to search for in the column
+        :param limit: The maximum number of rows to get, or None to get them all
+
+        :return: A list of dictionaries, or None if the query failed
+        """
+
+        return self.get_rows_where(table_name, key, str(value), limit, nocase=True)
+
+    def get_rows_where(self, table_name, key, value, limit=None, nocase=False):
+        """Get the rows where a column equals a value.
+
+        :param table_name: The name of a table in the database
+        :param key: The name of the column to search
+        :param value: The value to search for in the column
+        :param limit: The maximum number of rows to get, or None to get them all
+        :param nocase: Indicates whether to ignore capitalization
+
+        :return: A list of dictionaries, or None if the query failed
+        """
+
+        table_name = self.prepend_schema(table_name)
+        statement_key = ('SELECT', table_name, key, limit, nocase)
+        sql = self._statements.get(statement_key)
+        if sql is None:
+            sql = 'SELECT * FROM [{}] WHERE [{}] = ?'.format(table_name, key)
+            if nocase:
+                sql += ' COLLATE NOCASE'
+            if limit is not None:
+                sql += ' LIMIT {}'.format(int(limit))
+            self._statements[statement_key] = sql
+        try:
+            return self.fetch_rows(sql, (value,))
+        except Exception as e:
+            logging.debug('Failed to read {}. {}'.format(table_name, e))
 
     def _get_connection(self):
-        """Connect to the database."""
+        """Connect to the database, reusing the current thread's connection if it's open."""
 
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None:
+            return connection
         try:
-            return sqlite3.connect(self.source)
+            connection = sqlite3.connect(self.source, check_same_thread=False)
         except Exception as e:
             logging.error('Failed to connect to {}. {}'.format(self.source, e))
+            return
+        try:
+            tune_connection(connection)
+        except sqlite3.Error as e:
+            logging.debug('Failed to tune the connection to {}. {}'.format(self.source, e))
+        self._local.connection = connection
+        self._connections.append(connection)
+        return connection
+
+    def get_value(self, table_name, column, where=None):
+        """Get a single value from a table, without building a dataframe.
+
+        :param table_name: The name of a table in a database
+        :param column: The name of the column to get the value from
+        :param where: An optional dictionary of column names and values (or lists of values)
+
+        :return: The value from the first matching row, or None if no rows match
+        """
+
+        table_name = self.prepend_schema(table_name)
+        sql = 'SELECT [{}] FROM [{}]'.format(column, table_name)
+        conditions, params = where_conditions(where)
+        if conditions:
+            sql += ' WHERE {}'.format(' AND '.join(conditions))
+        sql += ' LIMIT 1'
+        try:
+            row = self._get_connection().execute(sql, params).fetchone()
+        except Exception as e:
+            logging.debug('Failed to read {}. {}'.format(table_name, e))
+            return
+        if row is not None:
+            return row[0]
+
+    def has_table(self, table_name):
+        """Check whether a table exists, using the cached table names.
+
+        :param table_name: The name of a table, without the schema
+
+        :return: True if the table exists
+        """
+
+        self._load_table_names()
+        return table_name in self._table_set
 
     def import_df(self, df, table_name, overwrite=False):
         """Create or replace a table based on a Pandas dataframe.
@@ -97,59 +438,177 @@ class SQLiteDB:
         :param overwrite: A boolean indicating whether to overwrite or append an existing table
         """
 
-        if overwrite:
-            if_exists = 'replace'
-        else:
-            if_exists = 'append'
-
         connection = self._get_connection()
 
         # Write the table to the database.
         table_name = self.prepend_schema(table_name)
+        self._table_names = None
+        self._columns.pop(table_name, None)
+        if overwrite:
+            self._unique_indexes = {
+                key for key in self._unique_indexes if key[0] != table_name
+            }
+        col_names = [str(col_name) for col_name in df.columns]
+        col_defs = [
+            '[{}] {}'.format(col_name, get_sql_type(df[col]))
+            for col_name, col in zip(col_names, df.columns)
+        ]
+        sql = 'INSERT INTO [{}] ({}) VALUES ({})'.format(
+            table_name,
+            ', '.join('[{}]'.format(col_name) for col_name in col_names),
+            ', '.join(['?'] * len(col_names))
+        )
+        rows = [
+            [to_param(val) for val in row]
+            for row in df.itertuples(index=False, name=None)
+        ]
         try:
-            df.to_sql(table_name, connection, if_exists=if_exists, index=False)
+            with self.transaction():
+                if overwrite:
+                    connection.execute('DROP TABLE IF EXISTS [{}]'.format(table_name))
+                connection.execute(
+                    'CREATE TABLE IF NOT EXISTS [{}] ({})'.format(table_name, ', '.join(col_defs))
+                )
+                connection.executemany(sql, rows)
 
         # We may have a table with more columns than the one in the database.
         except OperationalError as op_error:
             try:
-                cursor = self.connection.execute('SELECT * FROM [{}]'.format(table_name))
-                col_names = [description[0].lower() for description in cursor.description]
-                cursor = self.connection.cursor()
-                for col_name in df.columns:
-                    if not col_name.lower() in col_names:
-                        cursor.execute(
-                            "ALTER TABLE [{}] ADD COLUMN '{}'".format(
-                                table_name,
-                                col_name
-                            )
-                        )
-                df.to_sql(table_name, self.connection, if_exists='append', index=False)
+                with self.transaction():
+                    self._add_columns(connection, table_name, col_names)
+                    connection.executemany(sql, rows)
             except Exception as e:
                 logging.warning('Failed to write {}. {}\n{}'.format(table_name, op_error, e))
         except Exception as e:
             logging.warning('Failed to write {}. {}'.format(table_name, e))
-        connection.close()
+
+    def _load_table_names(self):
+        """Read the table names from the database, unless they're already cached."""
+
+        if self._table_names is not None:
+            return
+        connection = self._get_connection()
+        cursor = connection.execute("SELECT name FROM sqlite_master WHERE type='table'")
+        raw_names = [row[0] for row in cursor.fetchall()]
+        if self.schema:
+            raw_names = ['.'.join(raw_name.split('.')[1:]) for raw_name in raw_names]
+        self._table_names = raw_names
+        self._table_set = set(raw_names)
 
     @property
     def table_names(self):
         """Return a list of all the tables in the database.
 
+        The list is cached until this object imports a table.
+
         :return: A list of table names
         """
 
+        self._load_table_names()
+        return list(self._table_names)
+
+    @contextlib.contextmanager
+    def transaction(self):
+        """Group writes so that they're committed together (or not at all).
+
+        Transactions can be nested. Only the outermost one commits.
+        """
+
         connection = self._get_connection()
-        metadf = pd.read_sql_query(
-                "SELECT name FROM sqlite_master WHERE type='table'",
-                connection
-            )
-        connection.close()
-        raw_names = list(metadf['name'])
-        if not self.schema:
-            return raw_names
-        table_names = []
-        for raw_name in raw_names:
-            table_names.append('.'.join(raw_name.split('.')[1:]))
-        return table_names
+        depth = getattr(self._local, 'transaction_depth', 0)
+        if not depth and not connection.in_transaction:
+            connection.execute('BEGIN')
+        self._local.transaction_depth = depth + 1
+        try:
+            yield connection
+        except BaseException:
+            if not depth:
+                connection.rollback()
+            raise
+        else:
+            if not depth:
+                connection.commit()
+        finally:
+            self._local.transaction_depth = depth
+
+    def upsert(self, table_name, row, id_col):
+        """Insert a row, or update the existing row with the same unique ID.
+
+        When updating an existing row, columns that aren't in the new row are left alone.
+
+        :param table_name: The name of a table in the database
+        :param row: A dictionary to define the new row
+        :param id_col: The name of the unique ID column
+        """
+
+        self.upsert_many(table_name, [row], id_col)
+
+    def upsert_many(self, table_name, rows, id_col):
+        """Insert rows, or update the existing rows with the same unique IDs.
+
+        Rows with the same columns are written with a single executemany call.
+
+        :param table_name: The name of a table in the database
+        :param rows: A list of dictionaries to define the new rows
+        :param id_col: The name of the unique ID column
+        """
+
+        # Group the rows by their columns, so that each group can share a statement.
+        groups = {}
+        for row in rows:
+            groups.setdefault(tuple(row.keys()), []).append(row)
+
+        full_name = self.prepend_schema(table_name)
+        connection = self._get_connection()
+
+        for columns, group in groups.items():
+            statement_key = ('UPSERT', full_name, id_col, columns)
+            sql = self._statements.get(statement_key)
+            if sql is None:
+                updates = [
+                    '[{0}] = excluded.[{0}]'.format(col) for col in columns if col != id_col
+                ]
+                if updates:
+                    action = 'UPDATE SET ' + ', '.join(updates)
+                else:
+                    action = 'NOTHING'
+                sql = 'INSERT INTO [{}] ({}) VALUES ({}) ON CONFLICT([{}]) DO {}'.format(
+                    full_name,
+                    ', '.join('[{}]'.format(col) for col in columns),
+                    ', '.join(['?'] * len(columns)),
+                    id_col,
+                    action
+                )
+                self._statements[statement_key] = sql
+
+            params = [[to_param(val) for val in row.values()] for row in group]
+            try:
+                self._add_unique_index(connection, full_name, id_col)
+                connection.executemany(sql, params)
+
+            # The table may not exist yet, or it may be missing some columns.
+            except OperationalError as op_error:
+                self._unique_indexes.discard((full_name, id_col))
+                if not self.has_table(table_name):
+                    self.import_df(pd.DataFrame(group), table_name)
+                    continue
+                try:
+                    self._add_columns(connection, full_name, columns)
+                    self._add_unique_index(connection, full_name, id_col)
+                    connection.executemany(sql, params)
+                except ClothoError:
+                    raise
+                except Exception as e:
+                    logging.warning('Failed to write {}. {}\n{}'.format(full_name, op_error, e))
+                    continue
+
+            # Don't hide duplicate IDs, which would silently drop the rows.
+            except ClothoError:
+                raise
+            except Exception as e:
+                logging.warning('Failed to write {}. {}'.format(full_name, e))
+                continue
+        self._commit(connection)
 
     @property
     def type(self):
@@ -164,19 +623,22 @@ class SQLiteDB:
         :param vals: A dictionary containing the unique ID and values to change
         """
 
-        pairs = []
-        for col, val in vals.items():
-            if val is None:
-                continue
-            pairs.append("{} = {}".format(col, quote_val(val)))
-        pair_string = ', '.join(pairs)
+        columns = tuple(sorted(col for col, val in vals.items() if val is not None))
+        if not columns:
+            return
 
+        # Reuse the SQL text so that sqlite3 can reuse the prepared statement.
         table_name = self.prepend_schema(table_name)
-        query = 'UPDATE [{}] SET {} WHERE {}'.format(
-            table_name,
-            pair_string,
-            condition(query_col, query_val)
-        )
+        statement_key = ('UPDATE', table_name, query_col, columns)
+        sql = self._statements.get(statement_key)
+        if sql is None:
+            sql = 'UPDATE [{}] SET {} WHERE [{}] = ?'.format(
+                table_name,
+                ', '.join('[{}] = ?'.format(col) for col in columns),
+                query_col
+            )
+            self._statements[statement_key] = sql
+        params = [to_param(vals[col]) for col in columns] + [to_param(query_val)]
         connection = self._get_connection()
-        connection.execute(query)
-        connection.commit()
+        connection.execute(sql, params)
+        self._commit(connection)
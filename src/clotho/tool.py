@@ -1,11 +1,10 @@
 """Define the Tool class."""
 
+import functools
 import importlib
 import logging
 import uuid
 
-import pandas as pd
-
 from clotho.clothodb import ClothoDB
 from clotho.toolparam import ToolParam
 from clotho import utils
@@ -15,6 +14,20 @@ from clotho.logutils import raise_error
 class ClothoToolError(Exception): pass
 
 
+@functools.lru_cache(maxsize=None)
+def _get_function(path):
+    """Import the function or method that a tool runs.
+
+    :param path: The dotted path to the function, like "package.module.function"
+
+    :return: The function
+    """
+
+    mod_path, func_name = path.rsplit('.', 1)
+    mod = importlib.import_module(mod_path)
+    return getattr(mod, func_name)
+
+
 class Tool:
     """Represents a tool configuration."""
 
@@ -25,6 +38,7 @@ class Tool:
             self._db = ClothoDB(db)
 
         self._config = None
+        self._io_rows = []
         self.params = {}
         self.predecessors = None
         self.outputs = []
@@ -37,68 +51,74 @@ class Tool:
 
         # If there's no unique ID, then create one.
         if not self.id:
-            self._config['ToolID'] = str(uuid.uuid1())
-
-        # Commit the tool.
-        self._db.set_row('Tools', self._config, 'ToolID')
-
-        # Commit the parameters.
-        for param in self.params.values():
-            param.commit(self.id)
-
-        # Commit the predecessors.
-        pred_rows = self._db.get('ToolPredecessors', """ "ToolID" == '{}' """.format(self.id))
-        db_preds = list(pred_rows.PredecessorID)
-        for pred_id in list(self.predecessors.ToolID):
-            if pred_id not in db_preds:
-                self._db.set_row(
-                    'ToolPredecessors',
-                    {
-                        'RelationshipID': str(uuid.uuid1()),
-                        'ToolID': self.id,
-                        'PredecessorID': pred_id
-                    },
-                    'RelationshipID'
-                )
+            self._config['ToolID'] = str(uuid.uuid4())
 
-        # Commit the outputs.
-        output_rows = self._db.get('ToolOutputs', """ "ToolID" == '{}' """.format(self.id))
-        for i, name in enumerate(self.outputs):
-            ids = list(output_rows.loc[output_rows.Name == name, 'OutputID'])
-            if ids:
-                id = ids[0]
-            else:
-                id = str(uuid.uuid1())
-            self._db.set_row(
+        with self._db.transaction():
+            # Commit the tool.
+            self._db.set_row('Tools', self._config, 'ToolID')
+
+            # Commit the parameters.
+            ToolParam.commit_many(self.params.values(), self.id)
+
+            # Commit the predecessors.
+            pred_rows = self._db.get(
+                'ToolPredecessors',
+                where={'ToolID': self.id},
+                columns=['PredecessorID']
+            )
+            db_preds = list(pred_rows.PredecessorID)
+            new_pred_rows = []
+            for pred_id in list(self.predecessors.ToolID):
+                if pred_id not in db_preds:
+                    new_pred_rows.append(
+                        {
+                            'RelationshipID': str(uuid.uuid4()),
+                            'ToolID': self.id,
+                            'PredecessorID': pred_id
+                        }
+                    )
+            self._db.set_rows('ToolPredecessors', new_pred_rows, 'RelationshipID')
+
+            # Commit the outputs.
+            output_rows = self._db.get(
                 'ToolOutputs',
-                {
-                    'OutputID': id,
-                    'ToolID': self.id,
-                    'OutputOrder': i,
-                    'Name': name
-                },
-                'OutputID'
+                where={'ToolID': self.id},
+                columns=['OutputID', 'Name']
             )
+            new_output_rows = []
+            for i, name in enumerate(self.outputs):
+                ids = list(output_rows.loc[output_rows.Name == name, 'OutputID'])
+                if ids:
+                    id = ids[0]
+                else:
+                    id = str(uuid.uuid4())
+                new_output_rows.append(
+                    {
+                        'OutputID': id,
+                        'ToolID': self.id,
+                        'OutputOrder': i,
+                        'Name': name
+                    }
+                )
+            self._db.set_rows('ToolOutputs', new_output_rows, 'OutputID')
 
     @property
     def config(self):
-        output_config = self._config.copy()
-
-        param_configs = {}
-        for name, param in self.params.items():
-            param_configs[name] = param.config
-            if 'ToolID' in param_configs[name]:
-                param_configs[name].pop('ToolID')
-        output_config['params'] = param_configs
-
-        preds = {}
-        for _, row in self.predecessors.iterrows():
-            preds[row['Name']] = {'ToolID': row['ToolID']}
-        output_config['predecessors'] = preds
-
-        output_config['outputs'] = self.outputs
-
-        return output_config
+        # Leave out the tool ID, without changing the parameters' own configs.
+        param_configs = {
+            name: {key: val for key, val in param.config.items() if key != 'ToolID'}
+            for name, param in self.params.items()
+        }
+        preds = {
+            pred_name: {'ToolID': pred_id}
+            for pred_name, pred_id in zip(self.predecessors.Name, self.predecessors.ToolID)
+        }
+        return {
+            **self._config,
+            'params': param_configs,
+            'predecessors': preds,
+            'outputs': self.outputs
+        }
 
     def configure(self, config=None, id=None):
         """Use the inputs and database to configure the tool.
@@ -124,11 +144,17 @@ class Tool:
 
         # Add any extra output names from the database.
         self.outputs = utils.get_case_insensitive(config, 'outputs', [])
-        output_rows = self._db.get('ToolOutputs', """ "ToolID" == '{}' """.format(self.id))
-        output_rows.sort_values('OutputOrder', inplace=True)
+        output_rows = self._db.get(
+            'ToolOutputs',
+            where={'ToolID': self.id},
+            columns=['Name'],
+            order_by='OutputOrder'
+        )
+        known_outputs = set(self.outputs)
         for db_name in output_rows.Name:
-            if db_name not in self.outputs:
+            if db_name not in known_outputs:
                 self.outputs.append(db_name)
+                known_outputs.add(db_name)
 
         self.init_params(config)
 
@@ -154,8 +180,11 @@ class Tool:
         if not tool_id:
             logging.info("""Tool "{}" isn't in the config database.""".format(self.name))
             return
-        query = "ToolID = '{}' AND Name = '{}'".format(tool_id, output_name)
-        df = self._db.get('ToolOutputs', query)
+        df = self._db.get(
+            'ToolOutputs',
+            where={'ToolID': tool_id, 'Name': output_name},
+            columns=['OutputID']
+        )
         if df.empty:
             logging.info(
                 """Tool "{}" doesn't have an output called "{}".""".format(self.name, output_name)
@@ -178,8 +207,11 @@ class Tool:
         if not tool_id:
             logging.info("""Tool "{}" isn't in the config database.""".format(self.name))
             return
-        query = "ToolID = '{}' AND Name = '{}'".format(tool_id, param_name)
-        df = self._db.get('ToolParams', query)
+        df = self._db.get(
+            'ToolParams',
+            where={'ToolID': tool_id, 'Name': param_name},
+            columns=['ParamID']
+        )
         if df.empty:
             logging.info(
                 """Tool "{}" doesn't have a parameter called "{}".""".format(self.name, param_name)
@@ -216,6 +248,9 @@ class Tool:
             }
         )
 
+        # Write the inputs that were recorded before the activity ran.
+        self.write_io()
+
     @property
     def id(self):
         return self._config.get('ToolID')
@@ -228,14 +263,14 @@ class Tool:
 
         # Get the params from the config file.
         param_configs = utils.get_case_insensitive(config, 'params', {})
-        param_config_ids = []
+        param_config_ids = set()
         for name, param_config in param_configs.items():
             param_config['Name'] = name
             param_config['ToolID'] = self.id
             param = ToolParam(self._db, param_config, resource_shed=self._resource_shed)
             param_id = param.config.get('ParamID')
             if param_id:
-                param_config_ids.append(param_id)
+                param_config_ids.add(param_id)
             self.params[name] = param
             if not param.is_input and (param.name not in self.outputs):
                 self.outputs.append(param.name)
@@ -243,7 +278,7 @@ class Tool:
         # Get any params from the database that weren't in the config file.
         if not self.id:
             return
-        param_rows = self._db.get('ToolParams', """ "ToolID" == '{}' """.format(self.id))
+        param_rows = self._db.get('ToolParams', where={'ToolID': self.id}, columns=['ParamID'])
         for param_id in param_rows.ParamID:
             if param_id not in param_config_ids:
                 param = ToolParam(self._db, id=param_id, resource_shed=self._resource_shed)
@@ -265,25 +300,30 @@ class Tool:
                 if pred_tool:
                     pred_id = pred_tool['ToolID']
             pred_ids.append(pred_id)
-        self.predecessors = pd.DataFrame({'Name': pred_names, 'ToolID': pred_ids})
 
-        # Get the predecessor IDs from the database.
-        if not self.id:
-            return
-        pred_rows = self._db.get('ToolPredecessors', """ "ToolID" == '{}' """.format(self.id))
-        for pred_id in pred_rows.PredecessorID:
-            if not pred_id:
-                continue
-            if pred_id not in pred_ids:
-                tool_row = self._db.get_row('Tools', 'ToolID', pred_id)
-                if tool_row is None:
-                    raise_error(
-                        'Predecessor tool {} not found.'.format(pred_id),
-                        ClothoToolError
-                    )
-                pred_name = tool_row.get('Name')
-                new_pred = pd.DataFrame([{'ToolID': pred_id, 'Name': pred_name}])
-                self.predecessors = pd.concat([self.predecessors, new_pred])
+        # Add any other predecessors from the database.
+        if self.id:
+            pred_rows = self._db.get(
+                'ToolPredecessors',
+                where={'ToolID': self.id},
+                columns=['PredecessorID']
+            )
+            known_ids = set(pred_ids)
+            for pred_id in pred_rows.PredecessorID:
+                if not pred_id:
+                    continue
+                if pred_id not in known_ids:
+                    tool_row = self._db.get_row('Tools', 'ToolID', pred_id)
+                    if tool_row is None:
+                        raise_error(
+                            'Predecessor tool {} not found.'.format(pred_id),
+                            ClothoToolError
+                        )
+                    pred_names.append(tool_row.get('Name'))
+                    pred_ids.append(pred_id)
+
+        import pandas as pd
+        self.predecessors = pd.DataFrame({'Name': pred_names, 'ToolID': pred_ids})
 
     @property
     def name(self):
@@ -294,56 +334,68 @@ class Tool:
         return self._config.get('Path')
 
     def run(self, **kwargs):
+        # Import here, because the toolshed module imports this one.
+        from clotho.toolshed import ToolShed
+
+        # Share one shed among this run's predecessors, so that each is read from the database
+        # once per run, and nothing carries over to the next run.
+        return self._run(ToolShed(self._db, self._resource_shed), kwargs)
+
+    def _run(self, tool_shed, kwargs):
         if self.path is None:
             raise_error(
                 'Path not found for tool "{}."'.format(self.name),
                 ClothoToolError
             )
-        pred_outputs, default_pred_name = self.run_predecessors(**kwargs)
+        pred_outputs, default_pred_name = self.run_predecessors(tool_shed, **kwargs)
         if pred_outputs is None:
             return
 
         if not self.id:
             self.commit()
-        activity_id = str(uuid.uuid1())
-        self.update_inputs(activity_id, pred_outputs, default_pred_name, kwargs)
-
-        # Run the function or method that we're here for.
-        mod_path, func_name = self.path.rsplit('.', 1)
-        mod = importlib.import_module(mod_path)
-        func = getattr(mod, func_name)
-        self.start_activity(activity_id)
-        try:
-            output_tuple = func(**kwargs)
-            if output_tuple is None:
-                output_tuple = ()
-            if not isinstance(output_tuple, tuple):
-                output_tuple = (output_tuple,)
-            output_dict = dict(zip(self.outputs, output_tuple))
-        except Exception as e:
-            logging.error('Tool {} failed. {}'.format(self.name, e))
-            # output_dict = {'succeeded': False, 'message': str(e)}
-
-            self.end_activity(activity_id, False, str(e))
-            return
-
-        # Associate this activity with any batches of data that we worked on.
-        batch_ids = output_dict.get('batch_ids', output_dict.get('batch_id'))
-        self.write_batches(batch_ids, activity_id)
-
-        # Record the results of the activity.
-        self.end_activity(activity_id, True, output_dict.get('message'))
+        activity_id = str(uuid.uuid4())
 
-        self.update_outputs(output_dict, activity_id, kwargs)
-
-        return output_dict
-
-    def run_predecessors(self, **kwargs):
+        # Don't let I/O rows from an earlier run that failed leak into this one.
+        self._io_rows = []
+        try:
+            self.update_inputs(activity_id, pred_outputs, default_pred_name, kwargs)
+
+            # Run the function or method that we're here for.
+            func = _get_function(self.path)
+            self.start_activity(activity_id)
+            try:
+                output_tuple = func(**kwargs)
+                if output_tuple is None:
+                    output_tuple = ()
+                if not isinstance(output_tuple, tuple):
+                    output_tuple = (output_tuple,)
+                output_dict = dict(zip(self.outputs, output_tuple))
+            except Exception as e:
+                logging.error('Tool {} failed. {}'.format(self.name, e))
+                # output_dict = {'succeeded': False, 'message': str(e)}
+
+                self.end_activity(activity_id, False, str(e))
+                return
+
+            # Associate this activity with any batches of data that we worked on.
+            batch_ids = output_dict.get('batch_ids', output_dict.get('batch_id'))
+            self.write_batches(batch_ids, activity_id)
+
+            # Record the results of the activity.
+            self.end_activity(activity_id, True, output_dict.get('message'))
+
+            self.update_outputs(output_dict, activity_id, kwargs)
+
+            return output_dict
+        finally:
+            self._io_rows = []
+
+    def run_predecessors(self, tool_shed, **kwargs):
         # Run the tool's predecessors.
         pred_outputs = {}
         for pred_id in self.predecessors.ToolID:
-            pred = Tool(self._db, id=pred_id, resource_shed=self._resource_shed)
-            result = pred.run(**kwargs)
+            pred = tool_shed.get(id=pred_id)
+            result = pred._run(tool_shed, dict(kwargs))
             if result is None:
                 logging.warning('"{}" failed due to "{}" failure.'.format(self.name, pred.name))
                 return None, None
@@ -405,7 +457,7 @@ class Tool:
                 elif val.lower() == 'false':
                     val = False
             kwargs[name] = val
-            param.record_io(activity_id, val, self.id)
+            self._io_rows.append(param.get_io_row(activity_id, val, self.id))
 
     def update_outputs(self, output_dict, activity_id, kwargs):
         # Record the outputs in the I/O table.
@@ -420,7 +472,8 @@ class Tool:
                     val = True
                 elif val.lower() == 'false':
                     val = False
-            param.record_io(activity_id, val, self.id)
+            self._io_rows.append(param.get_io_row(activity_id, val, self.id))
+        self.write_io()
 
     def write_batches(self, batch_ids, activity_id):
         """For a given activity (tool run), record the batches that it affected.
@@ -433,13 +486,20 @@ class Tool:
             return
         if not isinstance(batch_ids, list):
             batch_ids = [batch_ids]
-        for batch_id in batch_ids:
-            self._db.set_row(
-                'BatchActivity',
-                {
-                    'RelationshipID': str(uuid.uuid1()),
-                    'BatchID': batch_id,
-                    'ActivityID': activity_id
-                },
-                'RelationshipID'
-            )
+        rows = [
+            {
+                'RelationshipID': str(uuid.uuid4()),
+                'BatchID': batch_id,
+                'ActivityID': activity_id
+            }
+            for batch_id in batch_ids
+        ]
+        self._db.set_rows('BatchActivity', rows, 'RelationshipID')
+
+    def write_io(self):
+        """Write the pending ActivityIO rows for this tool's parameters, all at once."""
+
+        if not self._io_rows:
+            return
+        self._db.set_rows('ActivityIO', self._io_rows, 'IOID')
+        self._io_rows = []
@@ -1,6 +1,5 @@
 """Define the ToolGraph class."""
 
-from datetime import datetime
 import logging
 import pathlib
 import keyring
@@ -12,8 +11,17 @@ from clotho.clothodb import ClothoDB
 from clotho.toolparam import ToolParam
 from clotho.resource import Resource
 from clotho.tool import Tool
+from clotho.toolshed import ToolShed
 from clotho.utils import extract_batch_ids
 
+# The ActivityIO columns that add_data reads.
+IO_COLUMNS = [
+    'IOID', 'ActivityID', 'ParamName', 'Value', 'IsResource', 'IsInput', 'IsRead', 'IsWrite'
+]
+# The ActivityIO flags that add_data treats as False when they're missing.
+IO_FLAGS = ['IsResource', 'IsInput', 'IsRead']
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
 
 class ToolGraph:
     """Builds a visual graph of the tools."""
@@ -24,16 +32,21 @@ class ToolGraph:
         else:
             self._db = ClothoDB(db)
 
-        self._edges = pd.DataFrame()
+        # Edges are (src, dst, style, color) tuples.
+        self._edge_rows = []
+        self._tool_rows = {}
+        self._tool_shed = ToolShed(self._db)
         self._graph = pydot.Dot(graph_type='digraph', concentrate=True)
         self.name = name
         self.init_db_creds(db_cred_list)
-        self._nodes = pd.DataFrame()
+        self._node_ids = set()
+        # Nodes are (id, label, style, fillcolor, shape) tuples.
+        self._node_rows = []
         self.max_level = max_level
 
     def add_data(self, data_path):
         data_id = str(data_path).replace('\\\\', '/').replace('\\', '/').replace(':', '')
-        if (not self._nodes.empty) and (not self._nodes[self._nodes.id == data_id].empty):
+        if data_id in self._node_ids:
             return data_id
         data_path = pathlib.Path(data_path)
         batch_ids = extract_batch_ids(data_path, self._db_creds)
@@ -41,24 +54,40 @@ class ToolGraph:
             return
         self.add_node(data_id, data_path.name, 'lightblue')
         for batch_id in batch_ids:
-            relationships = self._db.get('BatchActivity', """ "BatchID" == '{}' """.format(batch_id))
-            for activity_id in relationships.ActivityID.unique():
-                activity = self._db.get_row('Activity', 'ActivityID', activity_id)
-                start_time = datetime.strptime(activity['StartTime'], '%Y-%m-%d %H:%M:%S')
-                end_time = datetime.strptime(activity['EndTime'], '%Y-%m-%d %H:%M:%S')
-                duration = end_time - start_time
+            relationships = self._db.get(
+                'BatchActivity',
+                where={'BatchID': batch_id},
+                columns=['ActivityID']
+            )
+            activities = self._db.get(
+                'Activity',
+                where={'ActivityID': list(relationships.ActivityID.unique())},
+                columns=['ActivityID', 'ToolName', 'StartTime', 'EndTime']
+            )
+
+            # Parse all the times at once.
+            start_times = pd.to_datetime(activities['StartTime'], format=TIME_FORMAT, cache=True)
+            end_times = pd.to_datetime(activities['EndTime'], format=TIME_FORMAT, cache=True)
+            durations = (end_times - start_times).dt.to_pytimedelta()
+
+            # Get the inputs & outputs for all the activities at once.
+            io = self._db.get(
+                'ActivityIO',
+                where={'ActivityID': list(activities.ActivityID)},
+                columns=IO_COLUMNS
+            )
+            io[IO_FLAGS] = io[IO_FLAGS].fillna(False).astype(bool)
+            io_by_activity = {
+                activity_id: group.to_dict('records')
+                for activity_id, group in io.groupby('ActivityID')
+            }
+
+            for activity, duration in zip(activities.to_dict('records'), durations):
+                activity_id = activity['ActivityID']
                 label = '{}\n{}\n{}'.format(activity['ToolName'], activity['StartTime'], duration)
                 self.add_node(activity['ActivityID'], label, 'yellowgreen', 'box')
                 self.add_edge(activity['ActivityID'], data_id)
-                io = self._db.get(
-                    'ActivityIO',
-                    """ "ActivityID" == '{}' """.format(activity_id)
-                )
-                io.fillna(
-                    value={'IsResource': False, 'IsInput': False, 'IsRead': False},
-                    inplace=True
-                )
-                for io_row in io.to_dict('records'):
+                for io_row in io_by_activity.get(activity_id, []):
                     if io_row['IsInput'] or io_row['IsRead']:
                         if io_row['IsResource']:
                             parent_id = self.add_data(io_row['Value'])
@@ -84,43 +113,23 @@ class ToolGraph:
         elif dst is None:
             logging.warning('Edge has null destination. Source: {}'.format(src))
             return False
-        edge_row = pd.DataFrame(
-            [
-                {
-                    'src': src,
-                    'dst': dst,
-                    'style': style,
-                    'color': color
-                }
-            ]
-        )
-        self._edges = pd.concat([self._edges, edge_row])
+        self._edge_rows.append((src, dst, style, color))
         return True
 
     def add_node(self, id, label=None, fill_color='yellow', shape='ellipse', style='filled'):
         if label is None:
             label = id
-        new_row = pd.DataFrame(
-            [
-                {
-                    'id': id,
-                    'label': label,
-                    'style': style,
-                    'fillcolor': fill_color,
-                    'shape': shape
-                }
-            ]
-        )
-        old_df = self._nodes
-        if not old_df.empty:
-            old_df = self._nodes[self._nodes.id != id]
-        self._nodes = pd.concat([old_df, new_row])
+        if id in self._node_ids:
+            self._node_rows = [row for row in self._node_rows if row[0] != id]
+        else:
+            self._node_ids.add(id)
+        self._node_rows.append((id, label, style, fill_color, shape))
 
     def add_outputs(self, tool_id):
-        params = self._db.get('ToolParams', """ "ToolID" == '{}' """.format(tool_id))
+        params = self.get_tool_rows('ToolParams', tool_id)
         param_names = list(params.Name)
-        outputs = self._db.get('ToolOutputs', """ "ToolID" == '{}' """.format(tool_id))
-        for _, row in outputs.iterrows():
+        outputs = self.get_tool_rows('ToolOutputs', tool_id)
+        for row in outputs.to_dict('records'):
             if row['Name'] in ['batch_id', 'batch_ids']:
                 continue
             if row['Name'] in param_names:
@@ -131,8 +140,7 @@ class ToolGraph:
             self.add_param(param)
 
     def add_param(self, param, level=0):
-        indent = ' ' * (level + 1)
-        logging.debug('{}-{}'.format(indent, param.name))
+        logging.debug('%s-%s', ' ' * (level + 1), param.name)
         if param.is_resource:
             # resource = Resource(self._db, {'Name': param.raw_value, 'ResourceID': param.id})
             resource = Resource(self._db, {'Name': param.raw_value})
@@ -157,17 +165,15 @@ class ToolGraph:
                 self.add_edge(param.tool_id, node_id)
 
     def add_tool(self, tool, level=0):
-        logging.debug('{}Adding {}.'.format(' ' * level, tool.name))
-        if (not self._nodes.empty) and (self._nodes['id'] == tool.id).sum():
+        logging.debug('%sAdding %s.', ' ' * level, tool.name)
+        if tool.id in self._node_ids:
             return tool.id
 
         predecessors = {}
         if self.max_level == -1 or level < self.max_level:
-            predecessor_rows = self._db.get(
-                'ToolPredecessors', """ "ToolID" == '{}' """.format(tool.id)
-            )
-            for _, row in predecessor_rows.iterrows():
-                pred_tool = Tool(self._db, id=row['PredecessorID'])
+            predecessor_rows = self.get_tool_rows('ToolPredecessors', tool.id)
+            for pred_id in predecessor_rows.PredecessorID:
+                pred_tool = self._tool_shed.get(id=pred_id)
                 self.add_tool(pred_tool, level + 1)
                 self.add_edge(pred_tool.id, tool.id, 'dashed', 'red')
                 predecessors[pred_tool.name] = pred_tool
@@ -181,18 +187,8 @@ class ToolGraph:
         return tool.id
 
     def add_tool_node(self, tool):
-        new_row = pd.DataFrame(
-            [
-                {
-                    'id': tool.id,
-                    'label': tool.name,
-                    'style': 'filled',
-                    'fillcolor': 'yellowgreen',
-                    'shape': 'box'
-                }
-            ]
-        )
-        self._nodes = pd.concat([self._nodes, new_row])
+        self._node_ids.add(tool.id)
+        self._node_rows.append((tool.id, tool.name, 'filled', 'yellowgreen', 'box'))
 
     def add_tool_params(self, tool, predecessors=None, level=0):
         if predecessors is None:
@@ -232,6 +228,34 @@ class ToolGraph:
             else:
                 self.add_param(param, level)
 
+    def cache_tool_rows(self, table_name, tool_ids, rows):
+        """Split rows from a table by tool, and remember them for get_tool_rows.
+
+        :param table_name: The name of a table with a ToolID column
+        :param tool_ids: The unique IDs of the tools that the rows were read for
+        :param rows: A Pandas dataframe containing the rows for those tools
+        """
+
+        groups = {
+            tool_id: group.reset_index(drop=True) for tool_id, group in rows.groupby('ToolID')
+        }
+        for tool_id in tool_ids:
+            self._tool_rows[(table_name, tool_id)] = groups.get(tool_id, rows.iloc[0:0])
+
+    def get_tool_rows(self, table_name, tool_id):
+        """Get the rows of a table that belong to a tool, querying the database only once.
+
+        :param table_name: The name of a table with a ToolID column
+        :param tool_id: The tool's unique ID
+
+        :return: A Pandas dataframe containing the tool's rows
+        """
+
+        key = (table_name, tool_id)
+        if key not in self._tool_rows:
+            self._tool_rows[key] = self._db.get(table_name, where={'ToolID': tool_id})
+        return self._tool_rows[key]
+
     def init_db_creds(self, db_cred_list):
         self._db_creds = {}
         if db_cred_list is None:
@@ -250,26 +274,49 @@ class ToolGraph:
                 db_info['pwd'] = keyring.get_password(resource_string, uid)
             self._db_creds[resource_string] = db_info
 
+    def load_tool_rows(self, tool_id):
+        """Read the rows for a tool and its predecessors, with one query per table per level.
+
+        This fills the cache that get_tool_rows uses, so that add_tool doesn't query the
+        database for each tool separately.
+
+        :param tool_id: The unique ID of the tool at the end of the graph
+        """
+
+        # Walk up the predecessors, one level at a time.
+        tool_ids = [tool_id]
+        new_ids = [tool_id]
+        known_ids = {tool_id}
+        level = 0
+        while new_ids and (self.max_level == -1 or level < self.max_level):
+            pred_rows = self._db.get('ToolPredecessors', where={'ToolID': new_ids})
+            self.cache_tool_rows('ToolPredecessors', new_ids, pred_rows)
+            new_ids = [
+                pred_id for pred_id in pred_rows.PredecessorID.dropna().unique()
+                if pred_id not in known_ids
+            ]
+            tool_ids.extend(new_ids)
+            known_ids.update(new_ids)
+            level += 1
+
+        for table_name in ['ToolParams', 'ToolOutputs']:
+            rows = self._db.get(table_name, where={'ToolID': tool_ids})
+            self.cache_tool_rows(table_name, tool_ids, rows)
+
     def plot_data_history(self, data_path):
         self.add_data(data_path)
         self.plot_nodes()
         self.plot_edges()
 
     def plot_edges(self):
-        self._edges.drop_duplicates(inplace=True)
-        for _, row in self._edges.iterrows():
-            kwargs = {}
-            for column in ['src', 'dst', 'style', 'color']:
-                kwargs[column] = row[column]
-            edge = pydot.Edge(**kwargs)
+        # Skip duplicate edges, but keep the order.
+        for src, dst, style, color in dict.fromkeys(self._edge_rows):
+            edge = pydot.Edge(src=src, dst=dst, style=style, color=color)
             self._graph.add_edge(edge)
 
     def plot_nodes(self):
-        for _, row in self._nodes.iterrows():
-            kwargs = {}
-            for column in ['label', 'style', 'fillcolor', 'shape']:
-                kwargs[column] = row[column]
-            node = pydot.Node(row['id'], **kwargs)
+        for id, label, style, fillcolor, shape in self._node_rows:
+            node = pydot.Node(id, label=label, style=style, fillcolor=fillcolor, shape=shape)
             self._graph.add_node(node)
 
     def plot_tool(self, name=None, id=None):
@@ -279,6 +326,7 @@ class ToolGraph:
             tool = Tool(self._db, {'Name': name})
             if not tool.id:
                 tool.commit()
+        self.load_tool_rows(tool.id)
         self.add_tool(tool)
         self.plot_nodes()
         self.plot_edges()
@@ -6,7 +6,7 @@ from clotho.clothodb import ClothoDB
 from clotho.logutils import raise_error
 from clotho.resource import Resource
 from clotho.utils import fill_config
-from clotho.utils import get_case_insensitive
+
 
 class ToolParam:
     """Represents a tool parameter configuration."""
@@ -29,16 +29,28 @@ class ToolParam:
         :param tool_id: The unique ID for the tool that uses this parameter
         """
 
-        self.config['ToolID'] = tool_id
+        self._set_ids(tool_id)
 
-        # If there's no unique ID, then create one.
-        if not self.config.get('ParamID'):
-            self.config['ParamID'] = str(uuid.uuid1())
+        # Write the name with the rest of the config, without copying the config.
+        self.config['Name'] = self.name
+        try:
+            self._db.set_row('ToolParams', self.config, 'ParamID')
+        finally:
+            self.config.pop('Name', None)
 
-        # Create or update the table row.
-        output_config = self.config.copy()
-        output_config['Name'] = self.name
-        self._db.set_row('ToolParams', output_config, 'ParamID')
+    @classmethod
+    def commit_many(cls, params, tool_id):
+        """Write several parameters to the database at once.
+
+        :param params: A list of ToolParams that use the same database
+        :param tool_id: The unique ID for the tool that uses these parameters
+        """
+
+        params = list(params)
+        if not params:
+            return
+        rows = [param.get_row(tool_id) for param in params]
+        params[0]._db.set_rows('ToolParams', rows, 'ParamID')
 
     def configure(self, config=None, id=None):
         """Use the inputs and database to configure the parameter.
@@ -59,13 +71,20 @@ class ToolParam:
         # If that didn't work, try getting it by tool ID & param name.
         # Note that different tools can have the same param names.
         if not self.config['ParamID'] and self.config['ToolID']:
-            big_df = self._db.get('ToolParams')
-            name_df = big_df[big_df['Name'].str.lower() == self.config['Name'].lower()]
-            df = name_df[name_df.ToolID == self.config['ToolID']]
-            if not df.empty:
-                row = df.to_dict('records')[0]
+            rows = self._db.get_rows(
+                'ToolParams',
+                '[ToolID] = ? AND [Name] = ? COLLATE NOCASE',
+                (self.config['ToolID'], self.config['Name']),
+                1
+            )
+            if rows:
+                row = rows[0]
+
+                # fill_config already matched the provided values to the column names, so only
+                # fill in the cells that it left blank.
                 for key, db_val in row.items():
-                    self.config[key] = get_case_insensitive(config, key, db_val)
+                    if self.config.get(key) is None:
+                        self.config[key] = db_val
 
         self.name = self.config.pop('Name')
         if self.config.get('IsInput') is None:
@@ -79,6 +98,34 @@ class ToolParam:
     def feeder_tool_name(self):
         return self.config.get('FeederToolName')
 
+    def get_io_row(self, activity_id, value, tool_id=None):
+        """Get a row for the ActivityIO table about this parameter's use during an activity.
+
+        :param activity_id: The unique ID for the current activity (tool run)
+        :param value: The argument to the parameter
+        :param tool_id: The unique ID if the tool that uses this parameter
+
+        :return: A dictionary to define the table row
+        """
+
+        tool_id = tool_id or self.config.get('ToolID')
+        if tool_id is None:
+            raise_error('No tool ID set for param {}.'.format(self.name))
+        if not self.id:
+            self.commit(tool_id)
+        return {
+            'IOID': str(uuid.uuid4()),
+            'ActivityID': activity_id,
+            'ParamID': self.id,
+            'ParamName': self.name,
+            'Value': value,
+            # 'Feeder': self.config.get('Feeder'),
+            'IsResource': self.config.get('IsResource', False),
+            'IsInput': self.is_input,
+            'IsRead': self.is_read,
+            'IsWrite': self.is_write
+        }
+
     def get_resource(self):
         """If this parameter represents a resource, then get the resource.
 
@@ -92,6 +139,19 @@ class ToolParam:
             return self._resource_shed.get(self.config.get('Value'))
         return Resource(self._db, {'Name': self.config.get('Value')})
 
+    def get_row(self, tool_id):
+        """Get the parameter's row for the ToolParams table, creating a unique ID if necessary.
+
+        :param tool_id: The unique ID for the tool that uses this parameter
+
+        :return: A dictionary to define the table row
+        """
+
+        self._set_ids(tool_id)
+        output_config = self.config.copy()
+        output_config['Name'] = self.name
+        return output_config
+
     @property
     def id(self):
         return self.config.get('ParamID')
@@ -124,27 +184,19 @@ class ToolParam:
         :param tool_id: The unique ID if the tool that uses this parameter
         """
 
-        tool_id = tool_id or self.config.get('ToolID')
-        if tool_id is None:
-            raise_error('No tool ID set for param {}.'.format(self.name))
-        if not self.id:
-            self.commit(tool_id)
-        self._db.set_row(
-            'ActivityIO',
-            {
-                'IOID': str(uuid.uuid1()),
-                'ActivityID': activity_id,
-                'ParamID': self.id,
-                'ParamName': self.name,
-                'Value': value,
-                # 'Feeder': self.config.get('Feeder'),
-                'IsResource': self.config.get('IsResource', False),
-                'IsInput': self.is_input,
-                'IsRead': self.is_read,
-                'IsWrite': self.is_write
-            },
-            'IOID'
-        )
+        self._db.set_row('ActivityIO', self.get_io_row(activity_id, value, tool_id), 'IOID')
+
+    def _set_ids(self, tool_id):
+        """Set the tool ID, and create a unique ID for the parameter if necessary.
+
+        :param tool_id: The unique ID for the tool that uses this parameter
+        """
+
+        self.config['ToolID'] = tool_id
+
+        # If there's no unique ID, then create one.
+        if not self.config.get('ParamID'):
+            self.config['ParamID'] = str(uuid.uuid4())
 
     @property
     def tool_id(self):
@@ -0,0 +1,59 @@
+"""Define the ToolShed class."""
+
+from clotho.clothodb import ClothoDB
+from clotho.tool import Tool
+
+
+class ToolShed:
+    """Instantiates and reuses Tool objects."""
+
+    def __init__(self, db, resource_shed=None) -> None:
+        if isinstance(db, ClothoDB):
+            self._db = db
+        else:
+            self._db = ClothoDB(db)
+
+        self.tools = {}
+        self._ids = {}
+        self._resource_shed = resource_shed
+
+    def add(self, tool):
+        """Remember a tool, so that later lookups by name or ID reuse it.
+
+        :param tool: A Tool
+        """
+
+        self.tools[tool.name] = tool
+        if tool.id:
+            self._ids[tool.id] = tool
+
+    def get(self, name=None, id=None):
+        """Get a tool by ID or name, instantiating it only if we haven't seen it yet.
+
+        :param name: The unique name of a configured tool
+        :param id: The unique ID of a configured tool
+
+        :return: A Tool
+        """
+
+        if id:
+            tool = self._ids.get(id)
+        else:
+            tool = self.tools.get(name)
+        if not tool:
+            if id:
+                tool = Tool(self._db, id=id, resource_shed=self._resource_shed)
+            else:
+                tool = Tool(self._db, {'Name': name}, resource_shed=self._resource_shed)
+            self.add(tool)
+        return tool
+
+    def remove(self, tool):
+        """Forget a tool, so that the next lookup reads it from the database again.
+
+        :param tool: A Tool
+        """
+
+        self.tools.pop(tool.name, None)
+        if tool.id:
+            self._ids.pop(tool.id, None)
@@ -1,25 +1,38 @@
 from datetime import datetime
 from datetime import timedelta
 from datetime import timezone
+import functools
 import logging
+import math
 import pathlib
 import sqlite3
 
 import yaml
-import pandas as pd
 
 from clotho.errors import ClothoError
 
+Loader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+# Escape strings the way a Python string literal, and so DataFrame.query, expects.
+_QUOTE_TABLE = str.maketrans({'\\': '\\\\', "'": "\\'"})
+
 
 def condition(column, value):
-    """Build a condition string in the form "column == 'value'".
+    """Build a condition string for DataFrame.query in the form "column == 'value'".
+
+    If the value is a list, tuple, set, or Pandas series, the condition is in the form
+    "column in ('value1', 'value2')".
 
     :param column: The name of a table column to search
-    :param value: A string or number to search for
+    :param value: A string or number, or a collection of them, to search for
 
-    :return: A condition string in the form "column == 'value'"
+    :return: A condition string
     """
 
+    import numpy as np
+    import pandas as pd
+    if isinstance(value, (list, tuple, set, pd.Series, np.ndarray)):
+        return "{} in ({})".format(column, ', '.join(quote_vals(list(value))))
     return "{} == {}".format(column, quote_val(value))
 
 
@@ -52,7 +65,7 @@ def extract_file_batch_ids(data_path):
     try:
         if metadata_file.exists():
             with open(metadata_file, 'r') as stream:
-                metadata = yaml.load(stream, Loader=yaml.FullLoader)
+                metadata = yaml.load(stream, Loader=Loader)
                 batch_id = metadata.get('BatchID')
                 if batch_id is None:
                     return []
@@ -61,7 +74,9 @@ def extract_file_batch_ids(data_path):
     except OSError:
         pass
     if str(data_path.suffix).lower() == '.csv':
-        df = pd.read_csv(data_path)
+        import pandas as pd
+        # Only parse the BatchID column.
+        df = pd.read_csv(data_path, usecols=lambda col: col == 'BatchID')
         if 'BatchID' in df.columns:
             return list(df.BatchID.unique())
     return []
@@ -75,13 +90,15 @@ def extract_sqlite_batch_ids(data_path):
     :return: A list of batch IDs
     """
 
-    conn = sqlite3.connect(data_path.parent)
-    df = pd.read_sql(f'SELECT * FROM {data_path.name}', conn)
-    # shard = SQLiteShard(data_path.parent, 'clotho')
-    # df = shard.get(data_path.name)
-    if df is None:
-        return []
-    return list(df.BatchID.unique())
+    # Open the database read-only, and let SQLite find the distinct IDs.
+    uri = data_path.parent.resolve().as_uri() + '?mode=ro'
+    conn = sqlite3.connect(uri, uri=True)
+    try:
+        table_name = data_path.name.replace('"', '""')
+        rows = conn.execute(f'SELECT DISTINCT "BatchID" FROM "{table_name}"').fetchall()
+    finally:
+        conn.close()
+    return [row[0] for row in rows]
 
 
 def fill_config(db, table_name, id_column, config=None, id=None, name_column=None):
@@ -102,7 +119,8 @@ def fill_config(db, table_name, id_column, config=None, id=None, name_column=Non
     # Get the ID.
     if config is None:
         config = {}
-    id = get_case_insensitive(config, id_column, id)
+    lower_config = lower_keys(config)
+    id = lower_config.get(id_column.lower(), id)
 
     # Try getting the row from the database by ID.
     if id is None:
@@ -112,18 +130,19 @@ def fill_config(db, table_name, id_column, config=None, id=None, name_column=Non
 
     # If that didn't work, try getting it by name.
     if row is None and name_column:
-        name = get_case_insensitive(config, name_column)
+        name = lower_config.get(name_column.lower())
         if name:
             row = db.get_row_insensitive(table_name, name_column, name)
 
     # If we still haven't found it, make a blank dictionary.
     if row is None:
-        columns = db.get_columns(table_name)
-        row = dict(zip(columns, [None] * len(columns)))
+        row = dict.fromkeys(db.get_columns(table_name))
 
-    # Replace values from the database with provided values.
+    # Replace values from the database with provided values, if there are any.
+    if not lower_config:
+        return row
     for key, db_val in row.items():
-        val = get_case_insensitive(config, key, db_val)
+        val = lower_config.get(key.lower(), db_val)
         if isinstance(val, pathlib.Path):
             val = str(val)
         row[key] = val
@@ -134,15 +153,11 @@ def fill_config(db, table_name, id_column, config=None, id=None, name_column=Non
 def fill_nans(df):
     """Replace NaNs with appropriate values."""
 
-    values = {}
-    for col_name, dtype in df.dtypes.items():
-        lower_type = str(dtype).lower()
-        if str(dtype) == 'bool':
-            values[col_name] = False
-        elif ('int' in lower_type) or ('float' in lower_type):
-            values[col_name] = 0
-        else:
-            values[col_name] = ''
+    # Choose a fill value for each column from its dtype's kind code.
+    fill_values = {'b': False, 'i': 0, 'u': 0, 'f': 0}
+    values = {
+        col_name: fill_values.get(dtype.kind, '') for col_name, dtype in df.dtypes.items()
+    }
     return df.fillna(values)
 
 
@@ -156,12 +171,16 @@ def get_case_insensitive(dictionary, key, default_value=None):
     :return: The found or default value
     """
 
-    lower_name = key.lower()
-    for key, val in dictionary.items():
-        if key.lower() == lower_name:
-            return val
+    # Most keys already have the right capitalization.
+    if key in dictionary:
+        return dictionary[key]
 
-    return default_value
+    # Otherwise, lower the key that we're looking for once, and stop at the first match.
+    lower_name = key.lower()
+    return next(
+        (val for dict_key, val in dictionary.items() if dict_key.lower() == lower_name),
+        default_value
+    )
 
 
 def get_flex(dictionary, keys, synonyms=None, default_value=None):
@@ -181,15 +200,22 @@ def get_flex(dictionary, keys, synonyms=None, default_value=None):
 
     # Add synonyms to the list of keys.
     all_keys = []
+    lower_synonyms = lower_keys(synonyms)
     for key in keys:
         all_keys.append(key)
-        synonym = get_case_insensitive(synonyms, key)
+        synonym = synonyms[key] if key in synonyms else lower_synonyms.get(key.lower())
         if synonym:
             all_keys.append(synonym)
 
-    # Search for all the keys.
+    # Search for all the keys, lowering the dictionary's keys at most once.
+    lower_dictionary = None
     for key in all_keys:
-        val = get_case_insensitive(dictionary, key)
+        if key in dictionary:
+            val = dictionary[key]
+        else:
+            if lower_dictionary is None:
+                lower_dictionary = lower_keys(dictionary)
+            val = lower_dictionary.get(key.lower())
         if val:
             return val
 
@@ -202,25 +228,56 @@ def get_now():
 
 def get_time_string(time_obj):
     if isinstance(time_obj, datetime):
-        return time_obj.strftime('%Y-%m-%d %H:%M:%S')
+        # Format the fields directly, which is cheaper than parsing a strftime format.
+        return (
+            f'{time_obj.year:04d}-{time_obj.month:02d}-{time_obj.day:02d} '
+            f'{time_obj.hour:02d}:{time_obj.minute:02d}:{time_obj.second:02d}'
+        )
     if isinstance(time_obj, timedelta):
         return str(time_obj).split('.', 2)[0]
     raise_error('Attempted to convert unrecognized time object.')
 
 
+def get_schema_dtypes(table_name):
+    """Get the column types for a table in the Clotho schema, without copying its template.
+
+    :param table_name: The name of a table in the Clotho schema
+
+    :return: A dictionary of column names and types, or None if the table isn't in the schema
+    """
+
+    template = _read_schema_templates().get(table_name)
+    if template is None:
+        return
+    return template.dtypes.to_dict()
+
+
 def get_schema_templates():
     """Get empty tables for the Clotho schema.
 
+    The YAML file is only read once. Each call returns new copies of the tables.
+
     :return: A dictionary of table names and empty tables
     """
 
+    return {table_name: df.copy() for table_name, df in _read_schema_templates().items()}
+
+
+@functools.lru_cache(maxsize=1)
+def _read_schema_templates():
+    """Read the Clotho schema, and build an empty table for each table in it.
+
+    :return: A dictionary of table names and empty tables, which callers must not modify
+    """
+
     # Get the table configurations from this library's YAML file.
     yaml_path = pathlib.Path(__file__).parent / 'ClothoSchema.yaml'
     with open(yaml_path, 'r') as stream:
-        content = yaml.load(stream, Loader=yaml.FullLoader)
+        content = yaml.load(stream, Loader=Loader)
     schema = content.get('tables')
 
     # Create the tables.
+    import pandas as pd
     tables = {}
     for table_name, column_types in schema.items():
         columns = {}
@@ -232,19 +289,59 @@ def get_schema_templates():
     return tables
 
 
+def lower_keys(dictionary):
+    """Make a copy of a dictionary with lower-case keys, for repeated case-insensitive lookups.
+
+    If several keys differ only by capitalization, the first one wins, as in get_case_insensitive.
+
+    :param dictionary: A dictionary with string keys
+
+    :return: A new dictionary with lower-case keys
+    """
+
+    lowered = {}
+    for key, val in dictionary.items():
+        lowered.setdefault(key.lower(), val)
+    return lowered
+
+
 def quote_val(val):
     """See if a value is a string, and if so, put single quotes around it.
 
     :param val: A string or number
 
-    :return: The same value, but with single quotes if it's a string
+    :return: The same value, but with single quotes if it's a string, or None if it's NaN
     """
 
     if isinstance(val, str):
-        return "'{}'".format(val)
+        return "'{}'".format(val.translate(_QUOTE_TABLE))
+    if isinstance(val, float) and math.isnan(val):
+        return 'None'
     return str(val)
 
 
+def quote_vals(values):
+    """Quote several values at once, the same way that quote_val quotes one.
+
+    :param values: A Pandas series, or a list of strings and numbers
+
+    :return: A Pandas series of strings
+    """
+
+    import pandas as pd
+    if isinstance(values, pd.Series):
+        series = values
+    else:
+        # Keep each value's type, instead of letting pandas turn 1 into 1.0 next to 2.5.
+        series = pd.Series(list(values), dtype=object)
+    kind = pd.api.types.infer_dtype(series, skipna=False)
+    if kind in ('boolean', 'integer'):
+        return series.astype(str)
+    if kind == 'string':
+        return "'" + series.str.translate(_QUOTE_TABLE) + "'"
+    return series.map(quote_val)
+
+
 def raise_error(message):
     logging.error(message)
     raise ClothoError(message)
@@ -1,5 +1,80 @@
+import csv
+import pathlib
+import sqlite3
+
 import pandas as pd
 
+from clotho.sqlitedb import get_sql_type
+from clotho.utils import get_schema_templates
+
+
+def _csv_value(text):
+    # Read values the way pandas.read_csv would: blanks as NULL, then booleans and numbers.
+    if text == '':
+        return None
+    if text in ('True', 'False'):
+        return text == 'True'
+    for convert in (int, float):
+        try:
+            return convert(text)
+        except ValueError:
+            pass
+    return text
+
+
+def _to_bool(text):
+    # The CSVs have booleans both as True/False and as numbers like 1.0.
+    if text.lower() in ('true', 'false'):
+        return text.lower() == 'true'
+    return float(text) != 0
+
+
+def _column(template, col_name):
+    # Use the column's type from the Clotho schema, if it's there, instead of guessing.
+    if template is None or col_name not in template.columns:
+        return f'[{col_name}]', _csv_value
+    convert = {'b': _to_bool, 'i': int, 'u': int, 'f': float}.get(
+        template[col_name].dtype.kind,
+        str
+    )
+    col_def = f'[{col_name}] {get_sql_type(template[col_name])}'
+    return col_def, lambda text: convert(text) if text else None
+
+
+def load_csvs(db_path, folder):
+    """Create a SQLite database with a table for each CSV file in a folder."""
+
+    remove_db(db_path)
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    templates = get_schema_templates()
+    connection = sqlite3.connect(db_path)
+    with connection:
+        for csv_path in folder.glob('*.csv'):
+            template = templates.get(csv_path.stem.split('.')[-1])
+            with open(csv_path, newline='') as f:
+                reader = csv.reader(f)
+                header = next(reader)
+                col_defs, converters = zip(*(_column(template, name) for name in header))
+                marks = ', '.join('?' * len(header))
+                connection.execute(f'CREATE TABLE [{csv_path.stem}] ({", ".join(col_defs)})')
+                connection.executemany(
+                    f'INSERT INTO [{csv_path.stem}] VALUES ({marks})',
+                    (
+                        [convert(text) for convert, text in zip(converters, row)]
+                        + [None] * (len(header) - len(row))
+                        for row in reader
+                    )
+                )
+    connection.close()
+
+
+def remove_db(db_path):
+    """Delete a SQLite database, along with any WAL files that belong to it."""
+
+    for path in (db_path, pathlib.Path(f'{db_path}-wal'), pathlib.Path(f'{db_path}-shm')):
+        if path.exists():
+            path.unlink()
+
 
 def test_get(victim):
     df = victim.get('Fruit')
@@ -8,6 +83,21 @@ def test_get(victim):
     df = victim.get('Fruit', """ "Name" == 'banana' """)
     assert len(df) == 1
 
+    df = victim.get('Fruit', where={'Name': "banana"})
+    assert len(df) == 1
+
+    df = victim.get('Fruit', where={'Name': "banana' OR '1' = '1"})
+    assert df.empty
+
+    df = victim.get('Fruit', where={'Name': ['apple', 'banana']})
+    assert len(df) == 2
+
+    df = victim.get('Fruit', where={'Name': 'banana'}, columns=['FruitID'])
+    assert list(df.columns) == ['FruitID']
+
+    df = victim.get('Fruit', order_by='Name')
+    assert list(df.Name) == sorted(df.Name)
+
 
 def test_import_df(victim):
     df = victim.get('Fruit')
@@ -18,6 +108,25 @@ def test_import_df(victim):
     df = victim.get('Fruit', """ "FruitID" == {} """.format(fruit_id))
     assert df['Name'].iloc[0] == 'tomato'
 
+    # Add a column that the table doesn't have yet.
+    addendum = pd.DataFrame(
+        [{'FruitID': fruit_id + 1, 'Name': 'plum', 'Color': 'purple', 'Season': 'summer'}]
+    )
+    victim.import_df(addendum, 'Fruit')
+    df = victim.get('Fruit', """ "FruitID" == {} """.format(fruit_id + 1))
+    assert df['Season'].iloc[0] == 'summer'
+
+
+def test_get_value(victim):
+    assert victim.get_value('Fruit', 'Name', {'FruitID': 1}) == 'banana'
+    assert victim.get_value('Fruit', 'Name', {'Name': "banana' OR '1' = '1"}) is None
+    assert victim.get_value('Fruit', 'FruitID', {'Name': ['banana']}) == 1
+
+
+def test_has_table(victim):
+    assert victim.has_table('Fruit')
+    assert not victim.has_table('Vegetables')
+
 
 def test_table_names(victim):
     table_names = victim.table_names
@@ -5,6 +5,7 @@ import shutil
 from clotho.clothoconfig import ClothoConfig
 from clotho.clothodb import ClothoDB
 from clotho.logutils import start_logging
+import dbtesthelpers
 
 DATA_FOLDER = pathlib.Path(__file__).parents[1] / 'data'
 INPUT_MAIN = DATA_FOLDER / 'input' / 'ClothoConfig.yaml'
@@ -18,8 +19,7 @@ DB = OUTPUT_FOLDER / 'TestDB.sqlite'
 def build_db():
     copy_config()
     # os.chdir(OUTPUT_FOLDER)
-    if DB.exists():
-        DB.unlink()
+    dbtesthelpers.remove_db(DB)
     OUTPUT_FOLDER.mkdir(parents=True, exist_ok=True)
     db = ClothoDB(DB)
     db.build_schema()
@@ -55,6 +55,7 @@ def build_db():
         },
         'ParamID'
     )
+    db.close()
 
 
 def copy_config():
@@ -70,7 +71,9 @@ def setup():
 
 @pytest.fixture
 def victim():
-    return ClothoConfig(DB)
+    db = ClothoDB(DB)
+    yield ClothoConfig(db)
+    db.close()
 
 def test_import_config(victim):
     result = victim.import_config({'tools': {'Crunch Data': None}})
@@ -2,8 +2,6 @@ from importlib_metadata import pathlib
 import pytest
 import sqlite3
 
-import pandas as pd
-
 from clotho.clothodb import ClothoDB
 from clotho.errors import ClothoError
 from clotho.logutils import start_logging
@@ -17,15 +15,15 @@ def next_fruit_id(victim):
 
 
 def create_fruit_table(source):
-    df = pd.DataFrame(
-        {
-            'FruitID': [0, 1, 2],
-            'Name': ['apple', 'banana', 'acorn'],
-            'Color': ['green', 'yellow', 'brown']
-        }
-    )
     conn = sqlite3.connect(source)
-    df.to_sql('Fruit', conn, if_exists='replace', index=False)
+    with conn:
+        conn.execute('DROP TABLE IF EXISTS [Fruit]')
+        conn.execute('CREATE TABLE [Fruit] ([FruitID] INTEGER, [Name] TEXT, [Color] TEXT)')
+        conn.executemany(
+            'INSERT INTO [Fruit] VALUES (?, ?, ?)',
+            [(0, 'apple', 'green'), (1, 'banana', 'yellow'), (2, 'acorn', 'brown')]
+        )
+    conn.close()
 
 
 @pytest.fixture(scope='module', autouse=True)
@@ -39,13 +37,25 @@ def victims():
     victims = [
         ClothoDB(test_sqlitedb.DB)
     ]
-    return victims
+    yield victims
+    for victim in victims:
+        victim.close()
 
 
 def test_build_schema(victims):
     for victim in victims:
         victim.build_schema()
-        assert 'Resources' in victim.table_names
+        assert victim.has_table('Resources')
+
+
+def test_create_indexes(victims):
+    for victim in victims:
+        victim.build_schema(create_indexes=False)
+        victim.create_indexes()
+        indexes = victim._db.fetch_rows("SELECT name FROM sqlite_master WHERE type = 'index'")
+        index_names = [index['name'] for index in indexes]
+        assert 'ix_clotho.Tools_Name_nocase' in index_names
+        assert 'ix_clotho.ToolParams_ToolID_Name' in index_names
 
 
 def test_delete_row(victims):
@@ -100,6 +110,24 @@ def test_get_row_insensitive(victims):
             victim.get_row_insensitive('Fruit', 'Name', 'cherry')
 
 
+def test_get_rows(victims):
+    for victim in victims:
+        rows = victim.get_rows('Fruit', '[Name] = ? COLLATE NOCASE', ('BANANA',))
+        assert len(rows) == 1
+        assert rows[0]['Name'] == 'banana'
+        assert len(victim.get_rows('Fruit', limit=1)) == 1
+
+
+def test_get_value(victims):
+    for victim in victims:
+        dbtesthelpers.test_get_value(victim)
+
+
+def test_has_table(victims):
+    for victim in victims:
+        dbtesthelpers.test_has_table(victim)
+
+
 def test_import_df(victims):
     for victim in victims:
         dbtesthelpers.test_import_df(victim)
@@ -121,6 +149,24 @@ def test_set_row(victims):
         victim.set_row('Fruit', row, 'FruitID')
         assert victim.get_row('Fruit', 'FruitID', id)['Color'] == 'purple'
 
+        # Columns that aren't in the row keep their old values.
+        victim.set_row('Fruit', {'FruitID': id, 'Color': 'green'}, 'FruitID')
+        grape = victim.get_row('Fruit', 'FruitID', id)
+        assert grape['Name'] == 'grape'
+        assert grape['Color'] == 'green'
+
+
+def test_set_rows(victims):
+    for victim in victims:
+        id = next_fruit_id(victim)
+        rows = [
+            {'FruitID': id, 'Name': 'kiwi', 'Color': 'brown'},
+            {'FruitID': id + 1, 'Name': 'lime'}
+        ]
+        victim.set_rows('Fruit', rows, 'FruitID')
+        assert victim.get_row('Fruit', 'FruitID', id)['Color'] == 'brown'
+        assert victim.get_row('Fruit', 'FruitID', id + 1)['Name'] == 'lime'
+
 
 def test_table_names(victims):
     for victim in victims:
@@ -37,6 +37,7 @@ def write_resources():
         {'Name': 'GIS', 'Path': 'GIS', 'ResourceID': PARENT_ID, 'Parent': GRANDPARENT_ID},
         'ResourceID'
     )
+    db.close()
 
 @pytest.fixture(scope='module', autouse=True)
 def setup():
@@ -45,7 +46,9 @@ def setup():
 
 @pytest.fixture
 def db():
-    return ClothoDB(DB_PATH)
+    db = ClothoDB(DB_PATH)
+    yield db
+    db.close()
 
 
 def test_init(db):
@@ -1,14 +1,12 @@
 from importlib.resources import Resource
 import pathlib
 import pytest
-import sqlite3
-
-import pandas as pd
 
 from clotho.clothodb import ClothoDB
 from clotho.logutils import start_logging
 from clotho.resourceshed import ResourceShed
 from clotho.toolparam import ToolParam
+import dbtesthelpers
 
 DATA_FOLDER = pathlib.Path(__file__).parents[1] / 'data'
 INPUT_FOLDER = DATA_FOLDER / 'input'
@@ -17,14 +15,7 @@ OUTPUT_FOLDER = DATA_FOLDER / 'output'
 DB = OUTPUT_FOLDER / 'TestDB.sqlite'
 
 def create_db():
-    if DB.exists():
-        DB.unlink()
-    DB.parent.mkdir(parents=True, exist_ok=True)
-    connection = sqlite3.connect(DB)
-    for csv in CLOTHO_FOLDER.glob('*.csv'):
-        df = pd.read_csv(csv)
-        df.to_sql(csv.stem, connection, if_exists='replace', index=False)
-    connection.close()
+    dbtesthelpers.load_csvs(DB, CLOTHO_FOLDER)
 
 
 @pytest.fixture(scope='module', autouse=True)
@@ -34,7 +25,9 @@ def setup():
 
 @pytest.fixture
 def victim():
-    return ResourceShed(DB)
+    db = ClothoDB(DB)
+    yield ResourceShed(db)
+    db.close()
 
 def test_get(victim):
     assert not victim.resources
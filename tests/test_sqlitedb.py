@@ -2,11 +2,14 @@ import os
 import pathlib
 import sqlite3
 
+import numpy as np
 import pandas as pd
 import pytest
 
+from clotho.errors import ClothoError
 from clotho.logutils import start_logging
 from clotho.sqlitedb import SQLiteDB
+from clotho.sqlitedb import to_param
 import dbtesthelpers
 
 DATA_FOLDER = pathlib.Path(__file__).parents[1] / 'data'
@@ -17,21 +20,22 @@ DB = OUTPUT_FOLDER / 'TestDB.sqlite'
 
 @pytest.fixture
 def victim():
-    return SQLiteDB(DB, 'clotho')
+    victim = SQLiteDB(DB, 'clotho')
+    yield victim
+    victim.close()
 
 
 def create_db():
-    if DB.exists():
-        DB.unlink()
-    df = pd.DataFrame(
-        {
-            'FruitID': [0, 1, 2],
-            'Name': ['apple', 'banana', 'acorn'],
-            'Color': ['green', 'yellow', 'brown']
-        }
-    )
+    dbtesthelpers.remove_db(DB)
     connection = sqlite3.connect(DB)
-    df.to_sql('clotho.Fruit', connection, if_exists='replace', index=False)
+    with connection:
+        connection.execute(
+            'CREATE TABLE [clotho.Fruit] ([FruitID] INTEGER, [Name] TEXT, [Color] TEXT)'
+        )
+        connection.executemany(
+            'INSERT INTO [clotho.Fruit] VALUES (?, ?, ?)',
+            [(0, 'apple', 'green'), (1, 'banana', 'yellow'), (2, 'acorn', 'brown')]
+        )
     connection.close()
 
 
@@ -41,6 +45,13 @@ def setup():
     create_db()
 
 
+def test_close(victim):
+    connection = victim._get_connection()
+    assert victim._get_connection() is connection
+    victim.close()
+    assert victim._get_connection() is not connection
+
+
 def test_delete_row(victim):
     assert not victim.get('Fruit', "Name == 'acorn'").empty
     victim.delete_row('Fruit', 'Name', 'acorn')
@@ -59,6 +70,30 @@ def test_get_connection(victim):
     victim._get_connection()
 
 
+def test_get_rows_insensitive(victim):
+    rows = victim.get_rows_insensitive('Fruit', 'Name', 'BANANA')
+    assert len(rows) == 1
+    assert rows[0]['Name'] == 'banana'
+    assert victim.get_rows_insensitive('Fruit', 'Name', 'mango') == []
+    assert victim.get_rows_insensitive('Vegetables', 'Name', 'kale') is None
+
+
+def test_get_rows_where(victim):
+    rows = victim.get_rows_where('Fruit', 'Name', 'banana')
+    assert len(rows) == 1
+    assert victim.get_rows_where('Fruit', 'Name', 'BANANA') == []
+    assert len(victim.get_rows_where('Fruit', 'Name', 'BANANA', nocase=True)) == 1
+    assert len(victim.get_rows_where('Fruit', 'FruitID', 1, limit=1)) == 1
+
+
+def test_get_value(victim):
+    dbtesthelpers.test_get_value(victim)
+
+
+def test_has_table(victim):
+    dbtesthelpers.test_has_table(victim)
+
+
 def test_import_df(victim):
     dbtesthelpers.test_import_df(victim)
 
@@ -67,6 +102,36 @@ def test_table_names(victim):
     dbtesthelpers.test_table_names(victim)
 
 
+def test_to_param():
+    assert to_param(np.int64(3)) == 3
+    assert to_param(pd.NaT) is None
+    assert to_param(pathlib.Path('a') / 'b') == str(pathlib.Path('a/b'))
+    assert to_param('a') == 'a'
+    assert to_param(['a']) == "['a']"
+
+
+def test_transaction(victim):
+    with victim.transaction():
+        victim.update('Fruit', 'FruitID', 1, {'Color': 'green'})
+        bananas = SQLiteDB(DB, 'clotho').get('Fruit', """ "FruitID" == 1 """)
+        assert bananas['Color'][0] == 'yellow'
+    bananas = SQLiteDB(DB, 'clotho').get('Fruit', """ "FruitID" == 1 """)
+    assert bananas['Color'][0] == 'green'
+
+
+def test_transaction_rollback(victim):
+    extra = pd.DataFrame([{'FruitID': 20, 'Name': 'quince', 'Color': 'yellow', 'Taste': 'sour'}])
+    with pytest.raises(RuntimeError):
+        with victim.transaction():
+            victim.update('Fruit', 'FruitID', 2, {'Color': 'purple'})
+            victim.import_df(extra, 'Fruit')
+            raise RuntimeError('Roll back.')
+    other = SQLiteDB(DB, 'clotho')
+    assert other.get('Fruit', where={'FruitID': 2})['Color'][0] != 'purple'
+    assert other.get('Fruit', where={'FruitID': 20}).empty
+    assert 'Taste' not in other.get_columns('Fruit')
+
+
 def test_update(victim):
     vals = {'Color': 'red'}
     victim.update('Fruit', 'FruitID', 0, vals)
@@ -74,3 +139,24 @@ def test_update(victim):
     assert len(apples) == 1
     assert apples['Name'][0] == 'apple'
     assert apples['Color'][0] == 'red'
+
+
+def test_upsert_many(victim):
+    rows = [{'FruitID': 10, 'Name': 'pear', 'Color': 'green'}, {'FruitID': 11, 'Name': 'plum'}]
+    victim.upsert_many('Fruit', rows, 'FruitID')
+    victim.upsert_many('Fruit', [{'FruitID': 10, 'Color': 'brown'}], 'FruitID')
+    pears = victim.get('Fruit', where={'FruitID': 10})
+    assert len(pears) == 1
+    assert pears['Color'][0] == 'brown'
+
+    # Replacing the table drops its unique index, so the next upsert has to recreate it.
+    victim.import_df(victim.get('Fruit'), 'Fruit', overwrite=True)
+    victim.upsert_many('Fruit', [{'FruitID': 11, 'Color': 'purple'}], 'FruitID')
+    plums = victim.get('Fruit', where={'FruitID': 11})
+    assert len(plums) == 1
+    assert plums['Color'][0] == 'purple'
+
+    # Duplicate IDs keep us from indexing the table, so the write should fail loudly.
+    victim.import_df(pd.DataFrame({'DupID': [1, 1], 'Name': ['a', 'b']}), 'Dups')
+    with pytest.raises(ClothoError):
+        victim.upsert_many('Dups', [{'DupID': 2, 'Name': 'c'}], 'DupID')
@@ -7,6 +7,7 @@ import pytest
 from clotho.clothodb import ClothoDB
 from clotho.logutils import start_logging
 from clotho.tool import Tool
+import dbtesthelpers
 
 DATA_FOLDER = pathlib.Path(__file__).parents[1] / 'data'
 INPUT_FOLDER = DATA_FOLDER / 'input'
@@ -28,7 +29,9 @@ def victim():
             }
         }
     }
-    return Tool(DB_PATH, tool_config)
+    db = ClothoDB(DB_PATH)
+    yield Tool(db, tool_config)
+    db.close()
 
 
 @pytest.fixture(scope='module', autouse=True)
@@ -38,11 +41,11 @@ def setup():
     # OUTPUT_CLOTHO_DB.mkdir(parents=True, exist_ok=True)
     # shutil.copytree(INPUT_CLOTHO_DB, OUTPUT_CLOTHO_DB, dirs_exist_ok=True)
 
-    if DB_PATH.exists():
-        DB_PATH.unlink()
+    dbtesthelpers.remove_db(DB_PATH)
     OUTPUT_FOLDER.mkdir(parents=True, exist_ok=True)
     db = ClothoDB(DB_PATH)
     db.build_schema()
+    db.close()
 
 
 def test_commit(victim):
@@ -100,6 +103,35 @@ def test_path(victim):
 def test_run(victim):
     victim.run()
 
+    # Rows left over from a run that raised shouldn't be written by the next run.
+    victim.update_inputs('Stale', {}, None, {})
+    victim.run()
+    victim.write_io()
+    assert victim._db.get_value('ActivityIO', 'IOID', {'ActivityID': 'Stale'}) is None
+
+
+def test_run_predecessors():
+    pred = Tool(
+        DB_PATH,
+        {'Name': 'PredTool', 'Path': 'clotho.utils.quote_val', 'Params': {'val': {'value': 'first'}}}
+    )
+    pred.commit()
+    victim = Tool(
+        DB_PATH,
+        {'Name': 'SuccTool', 'Path': 'clotho.utils.quote_val', 'predecessors': {'PredTool': None}}
+    )
+    victim.commit()
+    victim.run()
+
+    # Change the predecessor's config between runs. The next run should see the change.
+    param = pred.params['val']
+    param.value = 'second'
+    param.commit(pred.id)
+    victim.run()
+
+    rows = victim._db.get('ActivityIO', where={'ParamID': param.id}, columns=['Value'])
+    assert set(rows.Value) == {'first', 'second'}
+
 
 def test_start_activity(victim):
     activity_id = str(uuid.uuid1())
@@ -1,15 +1,13 @@
 import pathlib
 import pytest
 import shutil
-import sqlite3
-
-import pandas as pd
 
 from clotho.clothodb import ClothoDB
 from clotho.logutils import start_logging
 from clotho.resourceshed import ResourceShed
 from clotho.tool import Tool
 from clotho.toolparam import ToolParam
+import dbtesthelpers
 
 CONFIG_NAME = 'ClothoConfig.yaml'
 DATA_FOLDER = pathlib.Path(__file__).parents[1] / 'data'
@@ -38,24 +36,19 @@ CONFIG_2 = {
     'Name': 'output_csv',
     'Value': 'C:/Temp/Employees.csv'
 }
+CONFIGS = [CONFIG_1, CONFIG_2]
 
 
 def create_db():
-    if OUTPUT_CLOTHO_DB.exists():
-        OUTPUT_CLOTHO_DB.unlink()
-    OUTPUT_CLOTHO_DB.parent.mkdir(parents=True, exist_ok=True)
-    connection = sqlite3.connect(OUTPUT_CLOTHO_DB)
-    for csv in CLOTHO_FOLDER.glob('*.csv'):
-        df = pd.read_csv(csv)
-        df.to_sql(csv.stem, connection, if_exists='replace', index=False)
-    connection.close()
+    dbtesthelpers.load_csvs(OUTPUT_CLOTHO_DB, CLOTHO_FOLDER)
 
 
 def write_params():
     db = ClothoDB(DB_PATH)
-    db.build_schema()
-    db.set_row('ToolParams', CONFIG_1, 'ParamID')
-    db.set_row('ToolParams', CONFIG_2, 'ParamID')
+    db.build_schema(create_indexes=False)
+    db.set_rows('ToolParams', CONFIGS, 'ParamID')
+    db.create_indexes()
+    db.close()
 
 
 @pytest.fixture(scope='module', autouse=True)
@@ -65,35 +58,45 @@ def setup():
     write_params()
 
 
-@pytest.fixture
+@pytest.fixture(scope='module')
 def db():
-    return ClothoDB(DB_PATH)
+    db = ClothoDB(DB_PATH)
+    yield db
+    db.close()
+
+
+@pytest.fixture(scope='module')
+def clotho_db():
+    clotho_db = ClothoDB(OUTPUT_CLOTHO_DB)
+    yield clotho_db
+    clotho_db.close()
 
 
-def get_extractor_gz():
-    tool_id = Tool(OUTPUT_CLOTHO_DB, {'Name': 'Extract Weather'}).id
-    shed = ResourceShed(OUTPUT_CLOTHO_DB)
+@pytest.fixture(scope='module')
+def extractor_id(clotho_db):
+    return Tool(clotho_db, {'Name': 'Extract Weather'}).id
+
+
+def get_extractor_param(name, tool_id, clotho_db):
     return ToolParam(
-        OUTPUT_CLOTHO_DB,
-        {'Name': 'gz_file', 'ToolID': tool_id},
-        resource_shed=shed
+        clotho_db,
+        {'Name': name, 'ToolID': tool_id},
+        resource_shed=ResourceShed(clotho_db)
     )
 
 
+def get_extractor_gz(tool_id, clotho_db):
+    return get_extractor_param('gz_file', tool_id, clotho_db)
+
+
 @pytest.fixture
-def extractor_gz():
-    return get_extractor_gz()
+def extractor_gz(extractor_id, clotho_db):
+    return get_extractor_gz(extractor_id, clotho_db)
 
 
 @pytest.fixture
-def extractor_csv():
-    tool_id = Tool(OUTPUT_CLOTHO_DB, {'Name': 'Extract Weather'}).id
-    shed = ResourceShed(OUTPUT_CLOTHO_DB)
-    return ToolParam(
-        OUTPUT_CLOTHO_DB,
-        {'Name': 'output_path', 'ToolID': tool_id},
-        resource_shed=shed
-    )
+def extractor_csv(extractor_id, clotho_db):
+    return get_extractor_param('output_path', extractor_id, clotho_db)
 
 @pytest.fixture
 def victim(db):
@@ -112,20 +115,30 @@ def test_init(db):
 
 
 def test_commit(db):
-    row = db.get('ToolParams', """ "ParamID" == '{}' """.format(PARAM1_ID))
-    assert row['Name'].iloc[0] == 'endpoint'
+    assert db.get_value('ToolParams', 'Name', {'ParamID': PARAM1_ID}) == 'endpoint'
 
     param = ToolParam(db, config={'ToolID': TOOL_ID, 'name': 'EndPoint'})
     param.commit(TOOL_ID)
 
-    row = db.get('ToolParams', """ "ParamID" == '{}' """.format(PARAM1_ID))
-    assert row['Name'].iloc[0] == 'EndPoint'
+    assert db.get_value('ToolParams', 'Name', {'ParamID': PARAM1_ID}) == 'EndPoint'
 
     param = ToolParam(db, config={'ToolID': TOOL_ID, 'name': 'query'})
     param.commit(TOOL_ID)
 
-    row = db.get('ToolParams', """ "Name" == 'query' """)
-    assert row['ParamID'].iloc[0]
+    assert db.get_value('ToolParams', 'ParamID', {'Name': 'query'})
+
+
+def test_commit_many(db):
+    params = [
+        ToolParam(db, config={'ToolID': TOOL_ID, 'name': 'endpoint'}),
+        ToolParam(db, config={'ToolID': TOOL_ID, 'name': 'page_size'})
+    ]
+    ToolParam.commit_many(params, TOOL_ID)
+
+    row = db.get('ToolParams', where={'ParamID': PARAM1_ID})
+    assert row['Name'].iloc[0] == 'endpoint'
+    row = db.get('ToolParams', where={'Name': 'page_size'})
+    assert row['ParamID'].iloc[0] == params[1].id
 
 
 def test_configure(victim):
@@ -133,6 +146,13 @@ def test_configure(victim):
     assert victim.id == PARAM2_ID
 
 
+def test_get_io_row(extractor_gz):
+    row = extractor_gz.get_io_row('Activity1', 'My.gz')
+    assert row['ActivityID'] == 'Activity1'
+    assert row['ParamID'] == extractor_gz.id
+    assert row['Value'] == 'My.gz'
+
+
 def test_get_resource(extractor_gz):
     assert extractor_gz.get_resource().name == 'METAR GZ'
 
@@ -172,4 +192,5 @@ if __name__ == '__main__':
     create_db()
     write_params()
     test_init(ClothoDB(DB_PATH))
-    test_value(get_extractor_gz())
+    clotho_db = ClothoDB(OUTPUT_CLOTHO_DB)
+    test_value(get_extractor_gz(Tool(clotho_db, {'Name': 'Extract Weather'}).id, clotho_db))
@@ -0,0 +1,43 @@
+import pytest
+
+from clotho.clothodb import ClothoDB
+from clotho.logutils import start_logging
+from clotho.toolshed import ToolShed
+import test_resourceshed
+
+
+@pytest.fixture(scope='module', autouse=True)
+def setup():
+    start_logging()
+    test_resourceshed.create_db()
+
+
+@pytest.fixture
+def victim():
+    db = ClothoDB(test_resourceshed.DB)
+    yield ToolShed(db)
+    db.close()
+
+
+def test_add(victim):
+    tool = victim.get('Extract Weather')
+    other_shed = ToolShed(test_resourceshed.DB)
+    other_shed.add(tool)
+    assert other_shed.get('Extract Weather') is tool
+    assert other_shed.get(id=tool.id) is tool
+
+
+def test_get(victim):
+    assert not victim.tools
+    tool = victim.get('Extract Weather')
+    assert tool.name == 'Extract Weather'
+    assert 'Extract Weather' in victim.tools
+    assert victim.get(id=tool.id) is tool
+    assert victim.get('Extract Weather') is tool
+
+
+def test_remove(victim):
+    tool = victim.get('Extract Weather')
+    victim.remove(tool)
+    assert 'Extract Weather' not in victim.tools
+    assert victim.get(id=tool.id) is not tool
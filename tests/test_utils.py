@@ -1,7 +1,10 @@
+from datetime import datetime
+from datetime import timedelta
 import pathlib
 import pytest
 import sqlite3
 
+import numpy as np
 import pandas as pd
 
 from clotho.clothodb import ClothoDB
@@ -18,9 +21,14 @@ RESOURCE_ID = '64a3f200-d77e-11ec-a1b8-a44cc83e0d72'
 
 def write_data():
     df = pd.DataFrame({'A': [1, 2], 'BatchID': ['batch 1', 'batch 2']})
-    df.to_csv(CSV, index=False)
+    with open(CSV, 'w', newline='') as f:
+        df.to_csv(f, index=False, lineterminator='\n')
     conn = sqlite3.connect(FRUIT_DB)
-    df.to_sql('Fruit', conn, if_exists='replace', index=False)
+    with conn:
+        conn.execute('DROP TABLE IF EXISTS [Fruit]')
+        conn.execute('CREATE TABLE [Fruit] ([A] INTEGER, [BatchID] TEXT)')
+        conn.executemany('INSERT INTO [Fruit] VALUES (?, ?)', df.itertuples(index=False))
+    conn.close()
 
 
 def write_resources():
@@ -49,13 +57,21 @@ def setup():
 def test_condition():
     assert utils.condition('A', 1) == 'A == 1'
     assert utils.condition('A', '1') == "A == '1'"
+    assert utils.condition('A', ['x', 'y']) == "A in ('x', 'y')"
+    assert utils.condition('A', pd.Series([1, 2])) == 'A in (1, 2)'
+    assert utils.condition('A', np.int64(3)) == 'A == 3'
+    assert utils.condition('A', np.str_('ab')) == "A == 'ab'"
+
+    df = pd.DataFrame({'A': ["O'Hare", 'OHare', 'a\\b']})
+    assert list(df.query(utils.condition('A', "O'Hare")).A) == ["O'Hare"]
+    assert list(df.query(utils.condition('A', ["O'Hare", 'a\\b'])).A) == ["O'Hare", 'a\\b']
 
 
 def test_extract_batch_ids():
     batch_ids = utils.extract_batch_ids(CSV)
     check_batch_ids(batch_ids)
 
-    batch_ids = utils.extract_sqlite_batch_ids(FRUIT_DB / 'Fruit')
+    batch_ids = utils.extract_batch_ids(FRUIT_DB / 'Fruit')
     check_batch_ids(batch_ids)
 
 
@@ -85,6 +101,18 @@ def test_fill_config():
     config = utils.fill_config(**kwargs, config={'resourceid': RESOURCE_ID})
     assert config['Name'] == 'X Drive'
 
+    config = utils.fill_config(**kwargs, config={'Path': pathlib.Path('a')})
+    assert config['Path'] == 'a'
+
+
+def test_fill_nans():
+    df = pd.DataFrame({'a': [1.5, None], 'b': ['x', None]})
+    df['c'] = pd.Series([True, None], dtype='boolean')
+    filled = utils.fill_nans(df)
+    assert filled['a'][1] == 0
+    assert filled['b'][1] == ''
+    assert not filled['c'][1]
+
 
 def test_get_case_insensitive():
     d = {'A': 1}
@@ -100,14 +128,41 @@ def test_get_flex():
     assert utils.get_flex(d, 'b') is None
     assert utils.get_flex(d, 'b', {'b': 'a'})
     assert utils.get_flex(d, 'b', {'B': 'a'})
+    assert utils.get_flex({'a': 1, 'A': 2}, 'A') == 2
+    assert utils.get_flex({'a': 0, 'B': 3}, ['a', 'b']) == 3
 
 
 def test_get_now():
     now = utils.get_now()
     now_string = utils.get_time_string(now)
     assert now_string.startswith('20')
+    assert now_string == now.strftime('%Y-%m-%d %H:%M:%S')
+    assert utils.get_time_string(datetime(987, 6, 5, 4, 3, 2)) == '0987-06-05 04:03:02'
+    assert utils.get_time_string(timedelta(hours=1, microseconds=5)) == '1:00:00'
+
+
+def test_get_schema_dtypes():
+    dtypes = utils.get_schema_dtypes('ToolParams')
+    assert dtypes['IsInput'].kind == 'b'
+    assert utils.get_schema_dtypes('Vegetables') is None
+
+
+def test_lower_keys():
+    lowered = utils.lower_keys({'Name': 'a', 'NAME': 'b', 'ToolID': 1})
+    assert lowered == {'name': 'a', 'toolid': 1}
 
 
 def test_quote_val():
     assert utils.quote_val(1) == '1'
     assert utils.quote_val('1') == "'1'"
+    assert utils.quote_val("O'Hare") == "'O\\'Hare'"
+    assert utils.quote_val(float('nan')) == 'None'
+
+
+def test_quote_vals():
+    assert list(utils.quote_vals([1, 2])) == ['1', '2']
+    assert list(utils.quote_vals(["a", "O'Hare"])) == ["'a'", "'O\\'Hare'"]
+    assert list(utils.quote_vals(['a', 1])) == ["'a'", '1']
+    assert list(utils.quote_vals([1, 2.5])) == ['1', '2.5']
+    assert list(utils.quote_vals(['a', float('nan')])) == ["'a'", 'None']
+    assert list(utils.quote_vals([])) == []